@@ -0,0 +1,20 @@
+import os
+
+import config
+
+
+def app_data_path():
+    """
+    Returns the directory of the DB and the log, creates it if needed.
+    Qt free, shared by the GUI and the command line tools.
+    """
+    if "APPDATA" in os.environ:  # We are on Windows
+        path = os.path.join(os.environ["APPDATA"], config.appname)
+    elif "HOME" in os.environ:  # We are on Linux
+        path = os.path.join(os.environ["HOME"], "." + config.appname)
+    else:  # Fallback to our working dir
+        path = os.getcwd()
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
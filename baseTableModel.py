@@ -55,4 +55,12 @@ class BaseTaBleModel(QAbstractTableModel):
         for i in range(rows):
             self.items.pop(position)
         self.endRemoveRows()
-        return True
\ No newline at end of file
+        return True
+
+    def set_items(self, items):
+        """
+        Replaces all the rows with one model reset.
+        """
+        self.beginResetModel()
+        self.items = [list(item) for item in items]
+        self.endResetModel()
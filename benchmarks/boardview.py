@@ -0,0 +1,87 @@
+"""
+Startup, repaint and resize cost of the two board widgets:
+a QListView per cell against the painted BoardView.
+Usage: python benchmarks/boardview.py [tasks] [repaints]
+Runs offscreen unless QT_QPA_PLATFORM says otherwise.
+"""
+import os
+import sys
+import time
+import shutil
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+import config
+import storage
+from enums import Stages, Projects
+from main import MainWindow
+
+
+def fill(db_path, tasks):
+    db = storage.Storage(db_path)
+    cells = [(stage, project) for stage in Stages for project in Projects]
+    today = datetime.date.today()
+    db.add_tasks([("Task {}".format(i), cells[i % len(cells)][1],
+                   cells[i % len(cells)][0], None, None, None, today)
+                  for i in range(tasks)])
+    db.close()
+
+
+def bench(app, db_path, board, repaints):
+    config.board = board
+    db = storage.Storage(db_path)
+
+    began = time.perf_counter()
+    form = MainWindow(db)
+    form.resize(1280, 800)
+    form.show()
+    app.processEvents()
+    startup = time.perf_counter() - began
+
+    began = time.perf_counter()
+    for _ in range(repaints):
+        # Renders the window with all children, repaint() may skip them
+        form.grab()
+    repaint = (time.perf_counter() - began) / repaints
+
+    began = time.perf_counter()
+    for i in range(repaints):
+        form.resize(1280 - i % 2 * 200, 800 - i % 2 * 100)
+        app.processEvents()
+    resize = (time.perf_counter() - began) / repaints
+
+    # A saved snapshot would let the next run skip the board load
+    form.snapshot_path = None
+    form.close()
+    db.close()
+    return startup, repaint, resize
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repaints = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    app = QApplication(sys.argv)
+    # Generators have nothing to do with the widgets
+    MainWindow.generate_new_tasks = lambda self: None
+
+    directory = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(directory, "board.db")
+        fill(db_path, tasks)
+        print("{:<10}{:>14}{:>14}{:>14}".format("board", "startup ms",
+                                                "repaint ms", "resize ms"))
+        for board in ("lists", "painted"):
+            timings = bench(app, db_path, board, repaints)
+            print("{:<10}{:>14.1f}{:>14.2f}{:>14.2f}".format(
+                board, *(t * 1000 for t in timings)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
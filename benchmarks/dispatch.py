@@ -0,0 +1,109 @@
+"""
+Cost of delivering task add/drop events to the 49 cell models:
+the TaskPool registry against a signal broadcast every cell filters.
+Usage: python benchmarks/dispatch.py [tasks]
+"""
+import os
+import sys
+import time
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal
+
+import storage
+from enums import Stages, Projects
+from main import TaskPool, TaskListModel
+
+
+class NullWriter:
+    """
+    Swallows writes, so only the in-memory work is measured.
+    """
+
+    def submit(self, method, *args):
+        pass
+
+
+class Broadcaster(QObject):
+    """
+    The previous scheme, every cell listens to every event.
+    """
+    taskAdded = pyqtSignal(int, object, object)
+    taskDropped = pyqtSignal(int, object, object)
+
+
+def make_grid():
+    pool = TaskPool(storage.Storage(":memory:"), NullWriter())
+    models = [TaskListModel(stage, project, pool)
+              for stage in Stages for project in Projects]
+    return pool, models
+
+
+def records(tasks):
+    cells = [(stage, project) for stage in Stages for project in Projects]
+    today = datetime.date.today()
+    return [(i + 1, cells[i % len(cells)][1], cells[i % len(cells)][0],
+             "Task {}".format(i), None, None, today) for i in range(tasks)]
+
+
+def bench_registry(tasks):
+    pool, models = make_grid()
+    rows = records(tasks)
+    began = time.perf_counter()
+    pool.add_generated_tasks(rows)
+    added = time.perf_counter() - began
+
+    began = time.perf_counter()
+    for row in rows:
+        pool.drop_task(row[0])
+    dropped = time.perf_counter() - began
+    return added, dropped
+
+
+def bench_broadcast(tasks):
+    pool, models = make_grid()
+    broadcaster = Broadcaster()
+    for model in models:
+        def on_added(task_id, stage, project, model=model):
+            if model.stage == stage and model.project == project:
+                model.onItemAdded(task_id)
+
+        def on_dropped(task_id, stage, project, model=model):
+            if model.stage == stage and model.project == project:
+                model.onItemDropped(task_id)
+
+        broadcaster.taskAdded.connect(on_added)
+        broadcaster.taskDropped.connect(on_dropped)
+
+    rows = records(tasks)
+    began = time.perf_counter()
+    for task_id, project, stage, *_ in rows:
+        broadcaster.taskAdded.emit(task_id, stage, project)
+    added = time.perf_counter() - began
+
+    began = time.perf_counter()
+    for task_id, project, stage, *_ in rows:
+        broadcaster.taskDropped.emit(task_id, stage, project)
+    dropped = time.perf_counter() - began
+    return added, dropped
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = QCoreApplication(sys.argv)
+    print("{:<12}{:>16}{:>16}".format("dispatch", "add us/event",
+                                      "drop us/event"))
+    for name, bench in (("broadcast", bench_broadcast),
+                        ("registry", bench_registry)):
+        added, dropped = bench(tasks)
+        # Nothing is queued with direct connections, drain it anyway
+        # so one run does not leak events into the next
+        app.processEvents()
+        print("{:<12}{:>16.1f}{:>16.1f}".format(
+            name, added / tasks * 1e6, dropped / tasks * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold start budget check: imports the entry points with -X importtime,
+fails when one takes longer than its budget or pulls in a module
+that must only be imported on demand.
+Usage: python benchmarks/importtime.py [main budget ms] [tasktools budget ms]
+"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dialogs are imported when they are opened, the CLI never needs Qt
+DEFERRED = {
+    "main": ("taskedit", "genmanager", "reportmanager",
+             "ui.task", "ui.generators", "ui.generator", "ui.report"),
+    "tasktools": ("PyQt5",),
+}
+RUNS = 5
+
+
+def import_profile(module):
+    """
+    Returns {module name: (self us, cumulative us)} of one fresh import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True,
+        check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(own), int(cumulative))
+    return profile
+
+
+def check(module, budget_ms):
+    # The best of several runs, the first one also fills the OS caches
+    profiles = [import_profile(module) for _ in range(RUNS)]
+    profile = min(profiles, key=lambda p: p[module][1])
+    took_ms = profile[module][1] / 1000
+
+    print("{}: {:.1f} ms, budget {:.0f} ms".format(module, took_ms, budget_ms))
+    slowest = sorted(profile.items(), key=lambda item: item[1][0],
+                     reverse=True)[:8]
+    for name, (own, _) in slowest:
+        print("    {:<30}{:>8.1f} ms".format(name, own / 1000))
+
+    failures = []
+    if took_ms > budget_ms:
+        failures.append("{} took {:.1f} ms".format(module, took_ms))
+    for name in profile:
+        if any(name == deferred or name.startswith(deferred + ".")
+               for deferred in DEFERRED[module]):
+            failures.append("{} imports {}".format(module, name))
+    return failures
+
+
+def main():
+    budgets = {
+        "main": float(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        "tasktools": float(sys.argv[2]) if len(sys.argv) > 2 else 60,
+    }
+    failures = []
+    for module, budget_ms in budgets.items():
+        failures += check(module, budget_ms)
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
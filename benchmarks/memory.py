@@ -0,0 +1,74 @@
+"""
+Memory held by the task pool per 10k tasks: the previous task class
+with full texts against the slotted Task with text previews.
+Usage: python benchmarks/memory.py [tasks]
+"""
+import os
+import sys
+import random
+import datetime
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from enums import Stages, Projects
+from main import Task
+
+
+class DictTask():
+    """
+    The previous task class, attributes in a per-instance dict.
+    """
+
+    def __init__(self, task_id, project, stage, text, valid, deadline):
+        self.id = task_id
+        self.project = project
+        self.stage = stage
+        self.text = text
+        self.valid = valid
+        self.deadline = deadline
+
+
+def fill(db, tasks):
+    rng = random.Random(1)
+    words = ["call", "write", "review", "buy", "fix", "plan", "read", "send",
+             "report", "meeting", "notes", "garden", "invoice", "doctor"]
+    today = datetime.date.today()
+    rows = []
+    for i in range(tasks):
+        # Mostly short titles, some with long notes pasted in
+        length = rng.choice((3, 5, 8, 12, 60, 150))
+        text = " ".join(rng.choice(words) for _ in range(length))
+        rows.append((text, Projects.Business, Stages.Backlog,
+                     None, None, None, today))
+    db.add_tasks(rows)
+
+
+def measure(db, tasks, factory, preview):
+    tracemalloc.start()
+    records = db.select_cell_tasks(Stages.Backlog, Projects.Business, None,
+                                   tasks, preview=preview)
+    pool = {record[0]: factory(*record) for record in records}
+    # Only what the pool keeps alive counts
+    del records
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(pool), used
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    db = storage.Storage(":memory:")
+    fill(db, tasks)
+
+    print("{:<10}{:>10}{:>18}".format("pool", "tasks", "KiB per 10k"))
+    for name, factory, preview in (("dict", DictTask, None),
+                                   ("slots", Task, Task.PREVIEW)):
+        loaded, used = measure(db, tasks, factory, preview)
+        print("{:<10}{:>10}{:>18.0f}".format(
+            name, loaded, used / loaded * 10000 / 1024))
+
+
+if __name__ == "__main__":
+    main()
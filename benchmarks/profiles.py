@@ -0,0 +1,56 @@
+"""
+Compares storage.PROFILES presets on a scratch database.
+Usage: python benchmarks/profiles.py [tasks]
+"""
+import os
+import sys
+import time
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from enums import Stages, Projects
+
+
+def bench(profile, tasks):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = storage.Storage(os.path.join(tmp, "bench.db"), profile=profile)
+        projects = list(Projects)
+        start = datetime.date.today() - datetime.timedelta(days=365)
+
+        began = time.perf_counter()
+        ids = []
+        for i in range(tasks):
+            date = start + datetime.timedelta(days=i % 365)
+            ids.append(db.add_task("Task {}".format(i),
+                                   projects[i % len(projects)],
+                                   Stages.Incoming, None, None, date=date))
+        add_time = time.perf_counter() - began
+
+        began = time.perf_counter()
+        for task_id in ids:
+            db.set_new_stage(task_id, Stages.Done)
+        stage_time = time.perf_counter() - began
+
+        began = time.perf_counter()
+        rows = db.select_tasks_for_report(start, datetime.date.today())
+        report_time = time.perf_counter() - began
+        db.close()
+
+    return add_time / tasks, stage_time / tasks, report_time, len(rows)
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print("{:<10}{:>14}{:>14}{:>14}{:>8}".format(
+        "profile", "add ms/op", "stage ms/op", "report ms", "rows"))
+    for profile in [None] + list(storage.PROFILES):
+        add, stage, report, rows = bench(profile, tasks)
+        print("{:<10}{:>14.3f}{:>14.3f}{:>14.1f}{:>8}".format(
+            str(profile), add * 1000, stage * 1000, report * 1000, rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Move-heavy workloads on one big kanban cell: RowIndex against a list.
+Usage: python benchmarks/rowindex.py [cell size] [moves]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rowindex import RowIndex
+
+
+def run(container, rows, first_id):
+    """
+    Every move looks up the row of a task, removes it and puts
+    another task on top, like a drag out of and into the cell.
+    """
+    next_id = first_id
+    began = time.perf_counter()
+    for row in rows:
+        task_id = container[row]
+        container.pop(container.index(task_id))
+        container.insert(0, next_id)
+        next_id += 1
+    return time.perf_counter() - began
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    moves = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rng = random.Random(1)
+    workloads = {
+        # Tasks dragged right after they arrived on top
+        "recent": [min(int(rng.expovariate(0.1)), size - 1)
+                   for _ in range(moves)],
+        "uniform": [rng.randrange(size) for _ in range(moves)],
+        # Tasks that sit at the bottom of the backlog
+        "oldest": [size - 1 - min(int(rng.expovariate(0.1)), size - 1)
+                   for _ in range(moves)],
+    }
+
+    print("{:<10}{:>14}{:>18}".format("workload", "list us/move",
+                                      "RowIndex us/move"))
+    for name, rows in workloads.items():
+        timings = []
+        for factory in (list, RowIndex):
+            # Row 0 is the newest task
+            container = factory(range(size - 1, -1, -1))
+            timings.append(run(container, rows, size) / moves * 1e6)
+        print("{:<10}{:>14.2f}{:>18.2f}".format(name, *timings))
+
+
+if __name__ == "__main__":
+    main()
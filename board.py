@@ -0,0 +1,320 @@
+from PyQt5.QtCore import Qt, QObject, QModelIndex, QRect, QEvent, pyqtSignal
+from PyQt5.QtGui import QPainter, QDrag
+from PyQt5.QtWidgets import QWidget, QStyle, QStyledItemDelegate,\
+    QStyleOptionViewItem, QToolTip, QApplication
+
+from enums import Stages, Projects
+
+
+class BoardModel(QObject):
+    """
+    The whole kanban grid, one cell model per Stage x Project pair.
+    """
+
+    cellChanged = pyqtSignal(int, int)
+
+    def __init__(self, models):
+        """
+        :param models: dict of cell models keyed by (stage, project).
+        """
+        super(BoardModel, self).__init__()
+        self.stages = list(Stages)
+        self.projects = list(Projects)
+        self.__cells = [[models[(stage, project)] for project in self.projects]
+                        for stage in self.stages]
+        for i, column in enumerate(self.__cells):
+            for j, model in enumerate(column):
+                changed = (lambda *args, i=i, j=j:
+                           self.cellChanged.emit(i, j))
+                model.rowsInserted.connect(changed)
+                model.rowsRemoved.connect(changed)
+                model.modelReset.connect(changed)
+                model.dataChanged.connect(changed)
+
+    def cell(self, i, j):
+        """
+        Returns the model of the i-th stage and j-th project.
+        """
+        return self.__cells[i][j]
+
+
+class BoardView(QWidget):
+    """
+    Paints the whole board in one widget. Every cell scrolls on its own
+    and loads more tasks when scrolled to its end.
+    """
+
+    doubleClicked = pyqtSignal(QModelIndex)
+    dropTaskSignal = pyqtSignal(int)
+
+    MARGIN = 4
+    SPACING = 6
+    # Rows scrolled by one wheel step
+    WHEEL_ROWS = 3
+
+    def __init__(self, board):
+        super(BoardView, self).__init__()
+        self.board = board
+        self.delegate = QStyledItemDelegate(self)
+        self.__offsets = {}
+        # (model, task id) of the selected task
+        self.__selected = None
+        self.__drag_start = None
+        self.__drop_cell = None
+
+        metrics = self.fontMetrics()
+        self.__row_height = metrics.height() + self.MARGIN
+        self.__header_width = max(metrics.width(project.value)
+                                  for project in board.projects) \
+            + 2 * self.MARGIN
+        self.__header_height = metrics.height() + 2 * self.MARGIN
+
+        self.setAcceptDrops(True)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.board.cellChanged.connect(self.__update_cell)
+
+    # Geometry
+
+    def cell_rect(self, i, j):
+        width = (self.width() - self.__header_width) / len(self.board.stages)
+        height = (self.height() - self.__header_height) \
+            / len(self.board.projects)
+        return QRect(int(self.__header_width + i * width),
+                     int(self.__header_height + j * height),
+                     int(width) - self.SPACING, int(height) - self.SPACING)
+
+    def hit_test(self, pos):
+        """
+        Returns (i, j, row) of the cell under the point, row is -1
+        below the last task, None outside of the cells.
+        """
+        width = (self.width() - self.__header_width) / len(self.board.stages)
+        height = (self.height() - self.__header_height) \
+            / len(self.board.projects)
+        if width <= 0 or height <= 0:
+            return None
+        i = int((pos.x() - self.__header_width) // width)
+        j = int((pos.y() - self.__header_height) // height)
+        if not (0 <= i < len(self.board.stages)
+                and 0 <= j < len(self.board.projects)):
+            return None
+        rect = self.cell_rect(i, j)
+        if not rect.contains(pos):
+            return None
+        row = (pos.y() - rect.top() - 1) // self.__row_height \
+            + self.__offset(i, j)
+        if row >= self.board.cell(i, j).rowCount():
+            row = -1
+        return i, j, row
+
+    def __visible_rows(self, i, j):
+        return max((self.cell_rect(i, j).height() - 2) // self.__row_height, 0)
+
+    def __offset(self, i, j):
+        rows = self.board.cell(i, j).rowCount()
+        top = max(rows - self.__visible_rows(i, j), 0)
+        return min(self.__offsets.get((i, j), 0), top)
+
+    def __update_cell(self, i, j):
+        self.update(self.cell_rect(i, j))
+
+    def __index_at(self, pos):
+        hit = self.hit_test(pos)
+        if hit is None or hit[2] == -1:
+            return None
+        i, j, row = hit
+        return self.board.cell(i, j).index(row)
+
+    # Painting
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        palette = self.palette()
+        exposed = event.rect()
+
+        for i, stage in enumerate(self.board.stages):
+            rect = self.cell_rect(i, 0)
+            header = QRect(rect.left(), 0, rect.width(), self.__header_height)
+            if header.intersects(exposed):
+                painter.drawText(header, Qt.AlignCenter, stage.value)
+        for j, project in enumerate(self.board.projects):
+            rect = self.cell_rect(0, j)
+            header = QRect(self.MARGIN, rect.top(),
+                           self.__header_width - self.MARGIN, rect.height())
+            if header.intersects(exposed):
+                painter.drawText(header, Qt.AlignLeft | Qt.AlignVCenter,
+                                 project.value)
+
+        option = QStyleOptionViewItem()
+        option.initFrom(self)
+        state = option.state & ~QStyle.State_HasFocus
+        for i in range(len(self.board.stages)):
+            for j in range(len(self.board.projects)):
+                rect = self.cell_rect(i, j)
+                if rect.intersects(exposed):
+                    self.__paint_cell(painter, palette, option, state,
+                                      i, j, rect)
+
+    def __paint_cell(self, painter, palette, option, state, i, j, rect):
+        painter.fillRect(rect, palette.base())
+        if self.__drop_cell == (i, j):
+            painter.setPen(palette.highlight().color())
+        else:
+            painter.setPen(palette.mid().color())
+        painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        model = self.board.cell(i, j)
+        selected = None
+        if self.__selected is not None and self.__selected[0] is model:
+            selected = self.__selected[1]
+        first = self.__offset(i, j)
+        last = min(first + self.__visible_rows(i, j), model.rowCount())
+        painter.save()
+        painter.setClipRect(rect.adjusted(1, 1, -1, -1))
+        for row in range(first, last):
+            option.rect = QRect(rect.left() + 1,
+                                rect.top() + 1 + (row - first) * self.__row_height,
+                                rect.width() - 2, self.__row_height)
+            option.state = state
+            if model.get_id(row) == selected:
+                option.state |= QStyle.State_Selected
+            self.delegate.paint(painter, option, model.index(row))
+        painter.restore()
+
+    # Mouse and keyboard
+
+    def mousePressEvent(self, event):
+        self.__drag_start = None
+        index = self.__index_at(event.pos())
+        if index is None:
+            self.__selected = None
+        else:
+            model = index.model()
+            self.__selected = (model, model.get_id(index.row()))
+            if event.button() == Qt.LeftButton:
+                self.__drag_start = event.pos()
+        self.update()
+
+    def mouseMoveEvent(self, event):
+        if self.__drag_start is None or not event.buttons() & Qt.LeftButton:
+            return
+        distance = (event.pos() - self.__drag_start).manhattanLength()
+        if distance < QApplication.startDragDistance():
+            return
+        self.__drag_start = None
+        model, task_id = self.__selected
+        if task_id not in model.tasks:
+            return
+
+        drag = QDrag(self)
+        drag.setMimeData(model.mimeData(
+            [model.index(model.tasks.index(task_id))]))
+        if drag.exec_(Qt.MoveAction) == Qt.MoveAction \
+                and task_id in model.tasks:
+            # The target cell has it now, like QListView after a move
+            model.removeRows(model.tasks.index(task_id), 1)
+
+    def mouseReleaseEvent(self, event):
+        self.__drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        index = self.__index_at(event.pos())
+        if index is not None:
+            self.doubleClicked.emit(index)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Delete:
+            if self.__selected is not None \
+                    and self.__selected[1] in self.__selected[0].tasks:
+                self.dropTaskSignal.emit(self.__selected[1])
+                self.__selected = None
+        else:
+            super(BoardView, self).keyPressEvent(event)
+
+    def wheelEvent(self, event):
+        hit = self.hit_test(event.pos())
+        if hit is None:
+            event.ignore()
+            return
+        i, j, _ = hit
+        steps = event.angleDelta().y() // 120
+        model = self.board.cell(i, j)
+        offset = max(self.__offset(i, j) - steps * self.WHEEL_ROWS, 0)
+        # Load the next page once the end of the cell comes into view
+        if offset + self.__visible_rows(i, j) >= model.rowCount() \
+                and model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
+        self.__offsets[(i, j)] = offset
+        self.__update_cell(i, j)
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            index = self.__index_at(event.pos())
+            if index is None:
+                QToolTip.hideText()
+                event.ignore()
+            else:
+                QToolTip.showText(event.globalPos(),
+                                  index.data(Qt.ToolTipRole), self)
+            return True
+        return super(BoardView, self).event(event)
+
+    # Drag and drop
+
+    def __drop_target(self, event):
+        """
+        Returns the hit of a drop the cell would accept, or None.
+        """
+        if not event.mimeData().hasText():
+            return None
+        hit = self.hit_test(event.pos())
+        if hit is None:
+            return None
+        try:
+            task_id = int(event.mimeData().text())
+        except ValueError:
+            return None
+        # Order inside the cell is not stored
+        if task_id in self.board.cell(hit[0], hit[1]).tasks:
+            return None
+        return hit
+
+    def __set_drop_cell(self, cell):
+        if cell != self.__drop_cell:
+            for old in (self.__drop_cell, cell):
+                if old is not None:
+                    self.__update_cell(*old)
+            self.__drop_cell = cell
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasText():
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
+    def dragMoveEvent(self, event):
+        hit = self.__drop_target(event)
+        if hit is None:
+            self.__set_drop_cell(None)
+            event.ignore()
+        else:
+            self.__set_drop_cell(hit[:2])
+            event.acceptProposedAction()
+
+    def dragLeaveEvent(self, event):
+        self.__set_drop_cell(None)
+
+    def dropEvent(self, event):
+        hit = self.__drop_target(event)
+        self.__set_drop_cell(None)
+        if hit is None:
+            event.ignore()
+            return
+        i, j, row = hit
+        model = self.board.cell(i, j)
+        index = model.index(row) if row != -1 else QModelIndex()
+        if model.dropMimeData(event.mimeData(), Qt.MoveAction, row, 0, index):
+            event.setDropAction(Qt.MoveAction)
+            event.accept()
+        else:
+            event.ignore()
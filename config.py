@@ -3,6 +3,12 @@ appname = "Toolbox"
 dbname = "tasks.db"
 log = "tasks.log"
 version = "0.7"
+# SQLite tuning preset: "durable", "balanced" or "fast", see storage.PROFILES
+db_profile = "balanced"
+# Board widget: "lists" for a QListView per cell, "painted" for one BoardView
+board = "lists"
+# Board snapshot file next to the DB, makes the first paint instant
+snapshot = "board.json"
 
 
 
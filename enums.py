@@ -4,27 +4,35 @@ import enum
 def adapt_enum(enum_obj):
     """
     SQLITE adapter for custom column type support.
+    Stores the member as its compact integer code.
     :param enum_obj:
     :return:
     """
-    return "{};{}".format(enum_obj.name, enum_obj.value)
+    return _codes[enum_obj]
 
 
 def convert_enum(enum_class):
     """
     SQLITE connector for custom column type support.
+    Understands both integer codes and the legacy "Name;Value" strings.
     :param enum_class:
     :return: converter function.
     """
+    table = {}
+    for en in enum_class:
+        table[str(_codes[en]).encode("utf-8")] = en
+        table[legacy_name(en).encode("utf-8")] = en
 
-    def func(s):
-        e_type, val = s.decode("utf-8").split(";")
-        if e_type in enum_class.__members__.keys():
-            return enum_class[e_type]
+    return table.get
 
-        return None
 
-    return func
+def legacy_name(enum_obj):
+    """
+    Returns the "Name;Value" string older databases stored.
+    :param enum_obj:
+    :return:
+    """
+    return "{};{}".format(enum_obj.name, enum_obj.value)
 
 
 def from_value(enumeration, value):
@@ -34,9 +42,10 @@ def from_value(enumeration, value):
     :param value:
     :return:
     """
-    for en in enumeration:
-        if en.value == value:
-            return en
+    try:
+        return enumeration(value)
+    except ValueError:
+        return None
 
 
 class Stages(enum.Enum):
@@ -62,3 +71,18 @@ class Projects(enum.Enum):
 class Generators(enum.Enum):
     Daily = "Daily"
     Monthly = "Monthly"
+
+
+def _build_codes(*enumerations):
+    """
+    Numbers the members of each enumeration from 1 in declaration order.
+    Codes are stored in the DB, so new members go to the end only.
+    """
+    codes = {}
+    for enumeration in enumerations:
+        for code, en in enumerate(enumeration, start=1):
+            codes[en] = code
+    return codes
+
+
+_codes = _build_codes(Stages, Projects, Generators)
@@ -67,7 +67,7 @@ class GenManager(Ui_Dialog, QDialog):
         generators = self.__storage.select_generators()
         for gen in generators:
             self.gen_model.insertRows(0, 1)
-            self.gen_model.setRowData(0, gen)
+            self.gen_model.setRowData(0, gen[:self.gen_model.columnCount()])
 
     def add_generator_clicked(self):
         """
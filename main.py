@@ -1,44 +1,53 @@
+# First, so the first paint is measured from before the Qt imports
+import metrics
+
 from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal,\
-    QSize, QMimeData, QVariant, QObject
+    QSize, QMimeData, QVariant, QObject, QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow,\
-    QListView, QLabel, QAbstractItemView
+    QListView, QLabel, QAbstractItemView, QMessageBox, QLineEdit
+from PyQt5.QtGui import QBrush, QColor
 
 from ui.mainWindow import Ui_MainWindow
-from taskedit import TaskEdit
-from genmanager import GenManager
-from reportmanager import Report
 
 import sys
 import os
 import logging
 import datetime
-from dateutil.relativedelta import relativedelta
+import contextlib
 
 import storage
+from writer import StorageWriter
+from rowindex import RowIndex
+from workers import GeneratorWorker, BoardLoader
+from board import BoardModel, BoardView
+import appdata
 import config
-from enums import Stages, Projects, Generators
+import snapshot
+import tracing
+from enums import Stages, Projects
 
-app_data_path = None
-if "APPDATA" in os.environ:  # We are on Windows
-    app_data_path = os.path.join(os.environ["APPDATA"], config.appname)
-elif "HOME" in os.environ:  # We are on Linux
-    app_data_path = os.path.join(os.environ["HOME"], "." + config.appname)
-else:  # Fallback to our working dir
-    app_data_path = os.getcwd()
 
-if not os.path.exists(app_data_path):
-    os.makedirs(app_data_path)
+class Task():
+    """
+    One task on the board. Long texts are kept as a preview
+    until the full text is needed, see TaskPool.get_task_stats_by_id.
+    """
 
+    __slots__ = ("id", "project", "stage", "text", "valid", "deadline",
+                 "truncated")
 
-class Task():
+    # Characters of the text loaded with the board
+    PREVIEW = 64
 
-    def __init__(self, task_id, project, stage, text, valid, deadline):
+    def __init__(self, task_id, project, stage, text, valid, deadline,
+                 truncated=False):
         self.id = task_id
         self.project = project
         self.stage = stage
         self.text = text
         self.valid = valid
         self.deadline = deadline
+        self.truncated = truncated
 
 
 class TaskPool(QObject):
@@ -46,53 +55,133 @@ class TaskPool(QObject):
     The lower level of task pool model.
     """
 
-    taskAdded = pyqtSignal(int, Stages, Projects)
-    taskDropped = pyqtSignal(int, Stages, Projects)
-
-    def __init__(self, storage):
+    def __init__(self, storage, writer=None):
+        """
+        :param storage: Storage for reads and inserts.
+        :param writer: optional StorageWriter, updates and deletes are
+        queued to it instead of being written on the calling thread.
+        """
         super(TaskPool, self).__init__()
         self.__pool = {}
+        self.__models = {}
+        # Rendered cell texts and tooltips, dropped when the task changes
+        self.__display = {}
+        self.__tooltips = {}
+        # Ids of the tasks matching the search, on the board or not
+        self.__matches = set()
+        # Bumped by every change of the board, see MainWindow.board_loaded
+        self.revision = 0
         self.__storage = storage
+        self.__writer = writer
+        # Writes collected by __write_group for the writer
+        self.__group = None
+        # Cells with writes queued to the writer since the last flush
+        self.__dirty = set()
+
+    def register_model(self, model):
+        """
+        Makes the model the one receiving the tasks of its cell.
+        """
+        self.__models[(model.stage, model.project)] = model
+
+    def __task_added(self, task_id, stage, project):
+        model = self.__models.get((stage, project))
+        if model is not None:
+            model.onItemAdded(task_id)
+
+    def __task_dropped(self, task_id, stage, project):
+        model = self.__models.get((stage, project))
+        if model is not None:
+            model.onItemDropped(task_id)
+
+    def __write(self, method, *args):
+        if self.__group is not None:
+            self.__group.append((method, args))
+        elif self.__writer is not None:
+            self.__writer.submit(method, *args)
+        else:
+            getattr(self.__storage, method)(*args)
+
+    @contextlib.contextmanager
+    def __write_group(self):
+        """
+        Applies the writes of the block all or none, in one transaction
+        or as one operation of the writer.
+        """
+        if self.__writer is None:
+            with self.__storage.transaction():
+                yield
+            return
+        self.__group = []
+        try:
+            yield
+            if self.__group:
+                self.__writer.submit_group(self.__group)
+        finally:
+            self.__group = None
+
+    def __touch(self, *cells):
+        """
+        Marks the (stage, project) cells changed by queued writes,
+        a page of them is read only after the writer catches up.
+        """
+        if self.__writer is not None:
+            self.__dirty.update(cells)
+
+    def __forget_rendered(self, task_id):
+        self.__display.pop(task_id, None)
+        self.__tooltips.pop(task_id, None)
 
     def __insert_task(self, task_id, project, stage, text, valid, deadline):
+        self.revision += 1
         new_task = Task(task_id, project, stage, text, valid, deadline)
         self.__pool[new_task.id] = new_task
 
-        self.taskAdded.emit(new_task.id, stage, project)
+        self.__task_added(new_task.id, stage, project)
 
-    def add_task(self, text, project, stage, valid, deadline,
-                 gen_id=None, date=None):
+    def add_task(self, text, project, stage, valid, deadline, date=None):
         task_id = self.__storage.add_task(text, project, stage,
-                                          valid, deadline,
-                                          gen_id=gen_id, date=date)
+                                          valid, deadline, date=date)
         self.__insert_task(task_id, project, stage, text, valid, deadline)
 
     def edit_task(self, task_id, text, project, stage, valid, deadline):
+        self.revision += 1
         task = self.__pool[task_id]
         old_stage = task.stage
         old_project = task.project
-        if old_stage != stage:
-            self.__storage.set_new_stage(task_id, stage)
-            task.stage = stage
-
-        if task.text != text or old_project != project or task.valid != valid \
-                or task.deadline != deadline:
-            self.__storage.set_new_stats(task_id, text, project, valid, deadline)
+        stats_changed = task.text != text or old_project != project \
+            or task.valid != valid or task.deadline != deadline
+        with self.__write_group():
+            if old_stage != stage:
+                self.__write("set_new_stage", task_id, stage,
+                             datetime.date.today())
+            if stats_changed:
+                self.__write("set_new_stats", task_id, text, project,
+                             valid, deadline)
+
+        task.stage = stage
+        self.__forget_rendered(task_id)
+        if stats_changed:
             task.text = text
+            task.truncated = False
             task.project = project
             task.valid = valid
             task.deadline = deadline
 
         if old_stage != stage or old_project != project:
-            self.taskDropped.emit(task_id, old_stage, old_project)
-            self.taskAdded.emit(task_id, task.stage, task.project)
+            self.__touch((old_stage, old_project), (stage, project))
+            self.__task_dropped(task_id, old_stage, old_project)
+            self.__task_added(task_id, task.stage, task.project)
 
     def drop_task(self, task_id):
+        self.revision += 1
         stage = self.__pool[task_id].stage
         project = self.__pool[task_id].project
-        self.__storage.delete_task(task_id)
+        self.__write("delete_task", task_id)
+        self.__touch((stage, project))
         del self.__pool[task_id]
-        self.taskDropped.emit(task_id, stage, project)
+        self.__forget_rendered(task_id)
+        self.__task_dropped(task_id, stage, project)
 
     def get_task_name_by_id(self, task_id):
         if task_id in self.__pool:
@@ -103,91 +192,199 @@ class TaskPool(QObject):
     def get_task_stats_by_id(self, task_id):
         if task_id in self.__pool:
             task = self.__pool[task_id]
+            if task.truncated:
+                task.text = self.__storage.select_task_text(task_id)
+                task.truncated = False
             return task.text, task.project, task.stage, task.valid, task.deadline
         else:
             return ""
 
+    def get_task_display(self, task_id):
+        """
+        Returns the text shown in the cell, rendered once per task.
+        """
+        display = self.__display.get(task_id)
+        if display is None:
+            display = self.get_task_name_by_id(task_id)
+            if len(display) > 23:
+                display = display[:20] + " ..."
+            self.__display[task_id] = display
+        return display
+
+    def get_task_tooltip(self, task_id):
+        """
+        Returns the full text with the dates, rendered once per task.
+        """
+        tooltip = self.__tooltips.get(task_id)
+        if tooltip is None:
+            text, *rest, valid, deadline = self.get_task_stats_by_id(task_id)
+            tooltip = text
+            if deadline:
+                tooltip = " ".join((tooltip, "D:", str(deadline)))
+            if valid:
+                tooltip = " ".join((tooltip, "V:", str(valid)))
+            self.__tooltips[task_id] = tooltip
+        return tooltip
+
+    def set_matches(self, task_ids):
+        """
+        Highlights the tasks found by the search.
+        :return: number of them on the board.
+        """
+        self.__matches = set(task_ids)
+        for model in self.__models.values():
+            model.matches_changed()
+        return sum(1 for task_id in self.__pool if task_id in self.__matches)
+
+    def is_match(self, task_id):
+        return task_id in self.__matches
+
     def onTaskMoved(self, task_id, new_stage, new_project):
         if task_id not in self.__pool:
             return False
 
+        self.revision += 1
         task = self.__pool[task_id]
-        if task.stage != new_stage:
-            self.__storage.set_new_stage(task_id, new_stage)
-            task.stage = new_stage
-
-        if task.project != new_project:
-            self.__storage.set_new_project(task_id, new_project)
-            task.project = new_project
+        with self.__write_group():
+            if task.stage != new_stage:
+                self.__write("set_new_stage", task_id, new_stage,
+                             datetime.date.today())
+            if task.project != new_project:
+                self.__write("set_new_project", task_id, new_project)
+        self.__touch((task.stage, task.project), (new_stage, new_project))
+
+        task.stage = new_stage
+        task.project = new_project
+        self.__forget_rendered(task_id)
 
     def load(self):
-        records = self.__storage.select_tasks_for_today()
-        for record in records:
-            self.__insert_task(*record)
+        """
+        Fills every cell with its first page of tasks.
+        """
+        for (stage, project), model in self.__models.items():
+            model.reset_tasks(*self.fetch_cell(stage, project, None,
+                                               model.PAGE_SIZE))
+
+    def fetch_cell(self, stage, project, before, limit):
+        """
+        Reads the next page of the cell into the pool.
+        :return: ids new to the board, the id to continue from and
+        whether the cell has no more tasks.
+        """
+        self.revision += 1
+        if (stage, project) in self.__dirty:
+            self.__writer.flush()
+            self.__dirty.clear()
+        records = self.__storage.select_cell_tasks(
+            stage, project, before, limit, preview=Task.PREVIEW)
+        task_ids = []
+        for task_id, project, stage, text, valid, deadline, truncated \
+                in records:
+            # Tasks moved in or added since are on the board already
+            if task_id not in self.__pool:
+                self.__pool[task_id] = Task(task_id, project, stage, text,
+                                            valid, deadline, truncated)
+                task_ids.append(task_id)
+        last_id = records[-1][0] if records else before
+        return task_ids, last_id, len(records) < limit
+
+    def snapshot(self):
+        """
+        Returns the board as the tasks and cells arguments of snapshot.save.
+        """
+        tasks = [(task.id, task.project, task.stage, task.text, task.valid,
+                  task.deadline, task.truncated)
+                 for task in self.__pool.values()]
+        cells = [(stage, project, list(model.tasks), model.last_id,
+                  model.exhausted)
+                 for (stage, project), model in self.__models.items()]
+        return tasks, cells
+
+    def restore(self, tasks, cells):
+        """
+        Fills the board from a snapshot instead of the DB.
+        :return: False, leaving the board empty, if the snapshot does not
+        cover every cell or lists tasks it does not have.
+        """
+        pool = {record[0]: Task(*record) for record in tasks}
+        contents = {(stage, project): (task_ids, last_id, exhausted)
+                    for stage, project, task_ids, last_id, exhausted
+                    in cells}
+        if contents.keys() != self.__models.keys() or not all(
+                task_id in pool for task_ids, *_ in contents.values()
+                for task_id in task_ids):
+            return False
 
-    def generate_new_tasks(self):
-        generators = self.__storage.select_generators()
-        today = datetime.date.today()
-        for generator in generators:
-            logging.info("Going to use generator: {}".format(generator))
-            gen_id = generator[0]
-            last_date = self.__storage.get_last_generated_date(gen_id)
-
-            gen_type = generator[1]
-            rate = generator[2]
-            if gen_type == Generators.Daily:
-                logging.info("The generator is: {}".format(gen_type))
-                if not last_date:
-                    logging.info("The generator is new!")
-                    self.generate_single_task(today, gen_id, *generator[3:])
-                else:
-                    logging.info("The generator is old!")
-                    for i in range(abs((last_date - today).days)):
-                        if (i + 1) % rate == 0:
-                            delta = datetime.timedelta(days=i+1)
-                            task_date = last_date + delta
-                            self.generate_single_task(
-                                task_date, gen_id, *generator[3:])
-            elif gen_type == Generators.Monthly:
-                logging.info("The generator is: {}".format(gen_type))
-                if not last_date:
-                    logging.info("The generator is new!")
-                    task_date = datetime.date(today.year, today.month, rate)
-                    if task_date <= today:
-                        self.generate_single_task(
-                            task_date, gen_id, *generator[3:])
-                else:
-                    logging.info("The generator is old!")
-                    logging.info("last date {}:".format(last_date))
-                    months = relativedelta(today, last_date).months
-                    logging.info("Difference: {}".format(months))
-                    for i in range(abs(months)):
-                        task_date = datetime.date(
-                            last_date.year, last_date.month, rate)
-                        delta = relativedelta(months=i+1)
-                        task_date = task_date + delta
-                        logging.info("New task date is {}:".format(task_date))
-                        if task_date <= today:
-                            logging.info("Generating task for  {}:"
-                                         .format(task_date))
-                            self.generate_single_task(
-                                task_date, gen_id, *generator[3:])
-        logging.info("Done generating!\n")
-
-    def generate_single_task(self, baseline_date, gen_id,
-                             text, project, stage, valid_days, deadline_days):
-        valid = None
-        deadline = None
+        self.revision += 1
+        self.__pool = pool
+        self.__display.clear()
+        self.__tooltips.clear()
+        for key, model in self.__models.items():
+            model.reset_tasks(*contents[key])
+        return True
+
+    def cell_limits(self):
+        """
+        Returns how many tasks every cell has loaded, at least a page.
+        """
+        return {key: max(len(model.tasks), model.PAGE_SIZE)
+                for key, model in self.__models.items()}
+
+    def reconcile(self, cells):
+        """
+        Replaces the cells that differ from the same pages read from the DB.
+        :param cells: {(stage, project): (records, last_id, exhausted)},
+        records as returned by Storage.select_cell_tasks with a preview.
+        :return: number of cells that were out of date.
+        """
+        stale = []
+        for key, (records, last_id, exhausted) in cells.items():
+            model = self.__models.get(key)
+            if model is None:
+                continue
+            if model.exhausted != exhausted \
+                    or [record[0] for record in records] != list(model.tasks) \
+                    or any(self.__differs(record) for record in records):
+                stale.append(key)
+
+        # A task may have moved between two stale cells, so all of them
+        # leave the pool before any is filled again
+        for key in stale:
+            for task_id in self.__models[key].tasks:
+                self.__pool.pop(task_id, None)
+                self.__forget_rendered(task_id)
+        for key in stale:
+            records, last_id, exhausted = cells[key]
+            for record in records:
+                self.__pool[record[0]] = Task(*record)
+            self.__models[key].reset_tasks([record[0] for record in records],
+                                           last_id, exhausted)
+        if stale:
+            self.revision += 1
+        return len(stale)
+
+    def __differs(self, record):
+        task = self.__pool.get(record[0])
+        if task is None:
+            return True
+        task_id, project, stage, text, valid, deadline, truncated = record
+        # The pool may hold the full text where the DB page has a preview
+        return (task.project, task.stage, task.text[:Task.PREVIEW],
+                task.valid, task.deadline) != \
+            (project, stage, text[:Task.PREVIEW], valid, deadline)
+
+    def add_generated_tasks(self, records):
+        """
+        Puts the tasks that fit for today on the board.
+        :param records: (task_id, project, stage, text, valid, deadline,
+        date) tuples from the generator catch-up.
+        """
         today = datetime.date.today()
-        if valid_days != '' and valid_days is not None:
-            valid = baseline_date + datetime.timedelta(days=valid_days)
-        if deadline_days != '' and deadline_days is not None:
-            deadline = baseline_date + datetime.timedelta(days=deadline_days)
-        task_id = self.__storage.add_task(text, project, stage, valid, deadline,
-                                          gen_id, baseline_date)
-        if (valid is None or valid >= today) \
-                and not (stage == Stages.Done and baseline_date < today):
-            self.__insert_task(task_id, project, stage, text, valid, deadline)
+        for task_id, project, stage, text, valid, deadline, date in records:
+            if (valid is None or valid >= today) \
+                    and not (stage == Stages.Done and date < today):
+                self.__insert_task(task_id, project, stage, text,
+                                   valid, deadline)
 
 
 class TaskListModel(QAbstractListModel):
@@ -197,26 +394,64 @@ class TaskListModel(QAbstractListModel):
 
     taskMoved = pyqtSignal(int, Stages, Projects)
 
+    PAGE_SIZE = 100
+    MATCH_BRUSH = QBrush(QColor(255, 230, 120))
+
     def __init__(self, stage, project, pool):
         super(TaskListModel, self).__init__()
-        self.tasks = []
+        self.tasks = RowIndex()
+        # Paging state, the id to read the next page from
+        self.last_id = None
+        self.exhausted = False
         self.stage = stage
         self.project = project
         self.pool = pool
-        self.pool.taskAdded.connect(self.onItemAdded)
-        self.pool.taskDropped.connect(self.onItemDropped)
+        self.pool.register_model(self)
         self.taskMoved.connect(self.pool.onTaskMoved)
 
-    def onItemAdded(self, task_id, stage, project):
-        if self.stage == stage and self.project == project:
-            self.insertRows(0, 1)
-            self.setData(self.index(0), task_id)
-
-    def onItemDropped(self, task_id, stage, project):
-        if self.stage == stage and self.project == project:
-            # self.tasks.remove(task_id)
-            index = self.tasks.index(task_id)
-            self.removeRows(index, 1)
+    def onItemAdded(self, task_id):
+        self.insert_task(0, task_id)
+
+    def onItemDropped(self, task_id):
+        index = self.tasks.index(task_id)
+        self.removeRows(index, 1)
+
+    def matches_changed(self):
+        if self.tasks:
+            self.dataChanged.emit(self.index(0),
+                                  self.index(len(self.tasks) - 1),
+                                  [Qt.BackgroundRole])
+
+    def reset_tasks(self, task_ids, last_id=None, exhausted=True):
+        """
+        Replaces the content of the cell with one model reset.
+        """
+        self.beginResetModel()
+        self.tasks = RowIndex(task_ids)
+        self.last_id = last_id
+        self.exhausted = exhausted
+        self.endResetModel()
+
+    # Lazy loading methods
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        task_ids, self.last_id, self.exhausted = self.pool.fetch_cell(
+            self.stage, self.project, self.last_id, self.PAGE_SIZE)
+        if not task_ids:
+            return
+        position = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), position,
+                             position + len(task_ids) - 1)
+        for task_id in task_ids:
+            self.tasks.insert(len(self.tasks), task_id)
+        self.endInsertRows()
 
     def get_id(self, row):
         return self.tasks[row]
@@ -231,23 +466,17 @@ class TaskListModel(QAbstractListModel):
             return QVariant()
 
         if role == Qt.ToolTipRole:
-            task_id = self.tasks[index.row()]
-            text, *rest, valid, deadline = self.pool.get_task_stats_by_id(task_id)
-            today = datetime.date.today()
-            if deadline:
-                text = " ".join((text, "D:", str(deadline)))
-            if valid:
-                text = " ".join((text, "V:", str(valid)))
-            return QVariant(text)
+            return QVariant(self.pool.get_task_tooltip(self.tasks[index.row()]))
+
+        elif role == Qt.BackgroundRole:
+            if self.pool.is_match(self.tasks[index.row()]):
+                return QVariant(self.MATCH_BRUSH)
+            return QVariant()
 
         elif role != Qt.DisplayRole:
             return QVariant()
 
-        task_id = self.tasks[index.row()]
-        text = self.pool.get_task_name_by_id(task_id)
-        if len(text) > 23:
-            text = text[:20] + " ..."
-        return QVariant(text)
+        return QVariant(self.pool.get_task_display(self.tasks[index.row()]))
 
     # Editable model methods
 
@@ -258,12 +487,10 @@ class TaskListModel(QAbstractListModel):
             return True
         return False
 
-    def insertRows(self, position, rows, parent=QModelIndex(), *args, **kwargs):
-        self.beginInsertRows(parent, position, position + rows - 1)
-        for i in range(rows):
-            self.tasks.insert(position, 0)
+    def insert_task(self, position, task_id):
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.tasks.insert(position, task_id)
         self.endInsertRows()
-        return True
 
     def removeRows(self, position, rows, parent=QModelIndex(), *args, **kwargs):
         self.beginRemoveRows(parent, position, position + rows - 1)
@@ -301,11 +528,14 @@ class TaskListModel(QAbstractListModel):
             return True
 
         task_id = int(mime.text())
+        # Order inside the cell is not stored, refuse to move within it
+        if task_id in self.tasks:
+            return False
+
         row = index.row()
         if row == -1:
             row = 0
-        self.insertRows(row, 1)
-        self.setData(self.index(row), task_id)
+        self.insert_task(row, task_id)
         self.taskMoved.emit(task_id, self.stage, self.project)
         return True
 
@@ -327,12 +557,25 @@ class TaskListView(QListView):
 
 class MainWindow(Ui_MainWindow, QMainWindow):
 
-    def __init__(self, storage):
+    def __init__(self, storage, writer=None):
         super(MainWindow, self).__init__()
 
         #
         self.storage = storage
-        self.taskpool = TaskPool(storage)
+        self.writer = writer
+        self.taskpool = TaskPool(storage, writer)
+        self.generator = None
+        self.generate_again = False
+        self.loader = None
+        self.loader_revision = None
+        # The board snapshot lives next to the DB
+        self.snapshot_path = None
+        if storage.db_path != ":memory:":
+            self.snapshot_path = os.path.join(
+                os.path.dirname(os.path.abspath(storage.db_path)),
+                config.snapshot)
+        self.board_date = None
+        self.closing = False
 
         # Set up the user interface
         self.setupUi(self)
@@ -346,7 +589,33 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.actionManage.triggered.connect(self.manage_patterns)
         self.actionReport.triggered.connect(self.report)
         self.actionExit.triggered.connect(self.close)
+        if self.writer is not None:
+            self.writer.writeFailed.connect(self.write_failed)
+
+        # Search box, searches once typing pauses
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search tasks")
+        self.search.setClearButtonEnabled(True)
+        self.search.setMaximumWidth(300)
+        self.mainToolBar.addWidget(self.search)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search_tasks)
+        self.search.textChanged.connect(lambda text: self.search_timer.start())
+
+        with metrics.phase("grid construction"):
+            if config.board == "painted":
+                self.__create_painted_board()
+            else:
+                self.__create_list_board()
 
+        self.load_initial_values()
+
+    def __create_list_board(self):
+        """
+        One QListView per cell, laid out in the grid with header labels.
+        """
         # Set headers for Stages
         for i, stage in enumerate(Stages):
             name = QLabel()
@@ -375,13 +644,100 @@ class MainWindow(Ui_MainWindow, QMainWindow):
                 listview.doubleClicked.connect(self.edit_task)
                 listview.dropTaskSignal.connect(self.taskpool.drop_task)
 
-        self.load_initial_values()
+    def __create_painted_board(self):
+        """
+        The whole grid painted by one BoardView.
+        """
+        models = {(stage, project): TaskListModel(stage, project,
+                                                  self.taskpool)
+                  for stage in Stages for project in Projects}
+        self.board = BoardView(BoardModel(models))
+        self.tasks.addWidget(self.board, 0, 0)
+
+        self.board.doubleClicked.connect(self.edit_task)
+        self.board.dropTaskSignal.connect(self.taskpool.drop_task)
 
     def load_initial_values(self):
-        self.taskpool.load()
-        self.taskpool.generate_new_tasks()
+        self.board_date = datetime.date.today()
+        restored = False
+        if self.snapshot_path is not None:
+            with metrics.phase("snapshot restore"):
+                saved = snapshot.load(self.snapshot_path,
+                                      self.storage.change_counter(),
+                                      self.board_date)
+                restored = saved is not None \
+                    and self.taskpool.restore(*saved)
+        if restored:
+            # Shown from the snapshot, the DB is checked in the background
+            self.reconcile_board()
+        else:
+            with metrics.phase("board load"):
+                self.taskpool.load()
+            # Let the board paint before the generators catch up
+            QTimer.singleShot(0, self.generate_new_tasks)
+
+    def reconcile_board(self):
+        if self.writer is not None:
+            self.writer.flush()
+        if self.loader is not None:
+            # finished is queued, the thread may still be winding down
+            self.loader.wait()
+        self.loader_revision = self.taskpool.revision
+        self.loader = BoardLoader(self.storage.db_path,
+                                  self.taskpool.cell_limits(), Task.PREVIEW,
+                                  config.db_profile)
+        # Handled once the thread is done, so a reload never starts
+        # while the previous loader is still running
+        self.loader.finished.connect(self.board_loaded)
+        self.loader.start()
+
+    def board_loaded(self):
+        if self.closing:
+            return
+        cells = self.loader.cells
+        if cells is not None:
+            # The board changed while the DB was read, read it again
+            if self.taskpool.revision != self.loader_revision:
+                self.reconcile_board()
+                return
+            stale = self.taskpool.reconcile(cells)
+            if stale:
+                logging.info("Snapshot differed in %d cells", stale)
+        self.generate_new_tasks()
+
+    def save_snapshot(self):
+        """
+        Stores the board for the next start, the writer must be closed.
+        """
+        if self.snapshot_path is None or self.board_date is None:
+            return
+        try:
+            snapshot.save(self.snapshot_path, self.storage.change_counter(),
+                          self.board_date, *self.taskpool.snapshot())
+        except OSError as e:
+            logging.exception(e)
+
+    def generate_new_tasks(self):
+        if self.generator is not None and self.generator.isRunning():
+            self.generate_again = True
+            return
+
+        self.generate_again = False
+        self.generator = GeneratorWorker(self.storage.db_path,
+                                         config.db_profile)
+        self.generator.tasksGenerated.connect(
+            self.taskpool.add_generated_tasks)
+        self.generator.finished.connect(self.generation_finished)
+        self.generator.start()
+
+    def generation_finished(self):
+        if self.generate_again:
+            self.generate_new_tasks()
 
     def add_new_task(self):
+        # Dialogs are imported on first use to keep the startup short
+        from taskedit import TaskEdit
+
         # Fire up widget
         task_manager = TaskEdit()
         task_manager.taskCreated.connect(self.taskpool.add_task)
@@ -395,6 +751,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         model = model_index.model()
         row = model_index.row()
         task_id = model.get_id(row)
+        from taskedit import TaskEdit
 
         # Fire up widget
         task_manager =\
@@ -407,16 +764,53 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.menuBar.setEnabled(True)
 
     def manage_patterns(self):
+        from genmanager import GenManager
+
         generator_manager = GenManager(self.storage)
-        generator_manager.generatorChanged.connect(
-            self.taskpool.generate_new_tasks)
+        generator_manager.generatorChanged.connect(self.generate_new_tasks)
         self.menuBar.setEnabled(False)
 
         generator_manager.exec_()
 
         self.menuBar.setEnabled(True)
 
+    def closeEvent(self, event):
+        # Pending moves must reach the DB before the app quits
+        self.closing = True
+        if self.loader is not None:
+            self.loader.wait()
+        if self.generator is not None:
+            self.generate_again = False
+            self.generator.wait()
+        if self.writer is not None:
+            self.writer.close()
+        self.storage.flush()
+        self.save_snapshot()
+        super(MainWindow, self).closeEvent(event)
+
+    def search_tasks(self):
+        query = self.search.text()
+        # Queued edits must be in the index first
+        if self.writer is not None:
+            self.writer.flush()
+        task_ids = self.storage.search_task_ids(query)
+        on_board = self.taskpool.set_matches(task_ids)
+        if query.strip():
+            self.statusBar().showMessage(
+                "{} tasks found, {} on the board".format(len(task_ids),
+                                                         on_board))
+        else:
+            self.statusBar().clearMessage()
+
+    def write_failed(self, message):
+        QMessageBox.warning(self, "Warning",
+                            "Changes were not saved: {}".format(message))
+
     def report(self):
+        from reportmanager import Report
+
+        if self.writer is not None:
+            self.writer.flush()
         report = Report(self.storage)
 
         self.menuBar.setEnabled(False)
@@ -427,24 +821,58 @@ class MainWindow(Ui_MainWindow, QMainWindow):
 
 
 if __name__ == "__main__":
+    app_data_path = appdata.app_data_path()
     log_name = os.path.join(app_data_path, config.log)
 
+    profiling = metrics.profiling_requested(sys.argv)
     logging.basicConfig(
         filename=log_name,
         format='%(asctime)s %(message)s',
-        level=logging.ERROR)
-        # level=logging.INFO)
-    logging.info("app_data_path:" + app_data_path)
-
+        level=logging.INFO if profiling else logging.ERROR)
+    logging.info("app_data_path: %s", app_data_path)
+    metrics.instrument(storage.Storage)
+    # Relative trace file names are put in the app data directory
+    trace = os.environ.get(tracing.TRACE_ENV)
+    if trace:
+        storage.Storage.default_trace = os.path.join(app_data_path, trace)
+    if profiling:
+        metrics.start_profiling()
+
+    exit_code = 1
+    db = None
+    writer = None
     try:
         app = QApplication(sys.argv)
 
-        storage = storage.Storage(os.path.join(app_data_path, config.dbname))
-        form = MainWindow(storage)
+        db_path = os.path.join(app_data_path, config.dbname)
+        with metrics.phase("storage open"):
+            db = storage.Storage(db_path, profile=config.db_profile)
+        # One-off after the upgrade, done before any other connection
+        # writes, a background rebuild would hold the write lock
+        # for longer than their busy timeout
+        if not db.daily_stats_ready():
+            with metrics.phase("daily stats backfill"):
+                db.rebuild_daily_stats()
+        writer = StorageWriter(db_path, profile=config.db_profile)
+        form = MainWindow(db, writer)
 
         form.showMaximized()
+        # Runs once the window has been shown and painted
+        QTimer.singleShot(0, metrics.first_paint)
 
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
 
     except Exception as e:
-        logging.exception(e)
\ No newline at end of file
+        logging.exception(e)
+
+    finally:
+        # Queued writes reach the DB however the app ends
+        if writer is not None:
+            writer.close()
+        if db is not None:
+            db.close()
+
+    logging.info("Metrics\n%s", metrics.report())
+    if profiling:
+        metrics.stop_profiling(app_data_path)
+    sys.exit(exit_code)
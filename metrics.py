@@ -0,0 +1,178 @@
+"""
+Timings of the startup phases and of every Storage call, plus the
+profiling switch that dumps cProfile and tracemalloc data.
+Qt free, the GUI and the command line tools can both use it.
+"""
+import os
+import time
+import bisect
+import logging
+import cProfile
+import functools
+import threading
+import contextlib
+import tracemalloc
+
+# Set TOOLBOX_PROFILE=1 or pass --profile to turn profiling on
+PROFILE_ENV = "TOOLBOX_PROFILE"
+PROFILE_FLAG = "--profile"
+
+# Close to the process start, first paint is measured from here
+STARTED = time.perf_counter()
+
+_lock = threading.Lock()
+# Phase name -> seconds, in the order the phases finished
+phases = {}
+# "Class.method" -> Histogram of its call durations
+calls = {}
+_profiler = None
+
+
+class Histogram:
+    """
+    Call durations in fixed buckets, cheap enough for every call.
+    """
+
+    # Upper bounds of the buckets in milliseconds, the last is open
+    BOUNDS_MS = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the percentile,
+        or the maximum for the open bucket.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def record_phase(name, seconds):
+    with _lock:
+        phases[name] = seconds
+    logging.info("%s took %.1f ms", name, seconds * 1000)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Times the block as a named startup phase.
+    """
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - began)
+
+
+def first_paint():
+    """
+    Records the time from the start to the moment it is called,
+    schedule it right after showing the main window.
+    """
+    record_phase("first paint", time.perf_counter() - STARTED)
+
+
+def record_call(name, seconds):
+    with _lock:
+        histogram = calls.get(name)
+        if histogram is None:
+            histogram = calls[name] = Histogram()
+        histogram.add(seconds)
+
+
+def _timed(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record_call(name, time.perf_counter() - began)
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument(cls, skip=("transaction",)):
+    """
+    Wraps every public method of the class to record its durations.
+    Methods returning cursors or context managers are timed until
+    they return, not until they are used up.
+    """
+    for name, member in list(vars(cls).items()):
+        if name.startswith("_") or name in skip or not callable(member) \
+                or getattr(member, "timed", False):
+            continue
+        setattr(cls, name, _timed("{}.{}".format(cls.__name__, name),
+                                  member))
+
+
+def report():
+    """
+    Returns phases and call statistics as readable text.
+    """
+    with _lock:
+        lines = ["Phases"]
+        for name, seconds in phases.items():
+            lines.append("  {:<28}{:>10.1f} ms".format(name, seconds * 1000))
+
+        lines.append("")
+        lines.append("  {:<40}{:>8}{:>12}{:>10}{:>10}{:>10}".format(
+            "Calls", "count", "total ms", "p50 ms", "p95 ms", "max ms"))
+        for name, histogram in sorted(calls.items(),
+                                      key=lambda item: -item[1].total):
+            lines.append(
+                "  {:<40}{:>8}{:>12.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                    name, histogram.count, histogram.total,
+                    histogram.percentile(0.5), histogram.percentile(0.95),
+                    histogram.max))
+    return "\n".join(lines)
+
+
+def profiling_requested(argv):
+    return PROFILE_FLAG in argv \
+        or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+def start_profiling():
+    """
+    Starts cProfile on the calling thread and tracemalloc.
+    """
+    global _profiler
+    tracemalloc.start()
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+
+def stop_profiling(directory):
+    """
+    Writes profile.pstats, memory.tracemalloc and metrics.txt
+    to the directory.
+    """
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(os.path.join(directory, "profile.pstats"))
+        _profiler = None
+    if tracemalloc.is_tracing():
+        tracemalloc.take_snapshot().dump(
+            os.path.join(directory, "memory.tracemalloc"))
+        tracemalloc.stop()
+    with open(os.path.join(directory, "metrics.txt"), "w") as metrics_file:
+        metrics_file.write(report() + "\n")
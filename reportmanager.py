@@ -1,7 +1,7 @@
 from ui.report import *
 
-from PyQt5.QtWidgets import QDialog, QHeaderView
-from PyQt5.QtCore import QDate, QSortFilterProxyModel
+from PyQt5.QtWidgets import QDialog, QHeaderView, QComboBox, QTableView
+from PyQt5.QtCore import QDate, Qt
 
 from baseTableModel import BaseTaBleModel
 from enums import Projects, Stages
@@ -13,14 +13,50 @@ class TaskModel(BaseTaBleModel):
 
     def __init__(self):
         super(TaskModel, self).__init__(self.headers)
-
-    def setRowData(self, row, values):
-        for i, val in enumerate(values):
-            if isinstance(val, (Stages, Projects)):
-                val = val.value
-            if isinstance(val, datetime.date):
-                val = str(val)
-            self.setData(self.index(row, i), val)
+        self.__column = None
+        self.__order = Qt.AscendingOrder
+
+    def set_tasks(self, tasks):
+        """
+        Replaces all the rows with one model reset, in the current order.
+        :param tasks: rows of Storage.select_report.
+        """
+        items = [[self.__cell(val) for val in task[1:]] for task in tasks]
+        if self.__column is not None:
+            self.__sort_items(items)
+        self.set_items(items)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sorts the list itself, a sort proxy would call data()
+        for every cell of a big report.
+        """
+        self.__column = column
+        self.__order = order
+        self.layoutAboutToBeChanged.emit()
+        rows = list(range(len(self.items)))
+        self.__sort_items(rows, key=lambda row: self.items[row])
+        self.items = [self.items[row] for row in rows]
+        new_rows = {old_row: new_row for new_row, old_row in enumerate(rows)}
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(
+            persistent, [self.index(new_rows[index.row()], index.column())
+                         for index in persistent])
+        self.layoutChanged.emit()
+
+    def __sort_items(self, items, key=lambda item: item):
+        column = self.__column
+        # Missing dates are empty strings, so they sort first
+        items.sort(key=lambda item: key(item)[column] or "",
+                   reverse=self.__order == Qt.DescendingOrder)
+
+    @staticmethod
+    def __cell(val):
+        if isinstance(val, (Stages, Projects)):
+            return val.value
+        if isinstance(val, datetime.date):
+            return str(val)
+        return val
 
 
 class ReportModel(BaseTaBleModel):
@@ -33,18 +69,28 @@ class ReportModel(BaseTaBleModel):
             self.insertRows(0, 1)
             self.setData(self.index(0, 0), project.value)
 
-    def init(self):
-        for row in range(self.rowCount()):
-            self.setData(self.index(row, 1), 0)
-            self.setData(self.index(row, 2), 0)
-            self.setData(self.index(row, 3), 0)
+    def set_totals(self, totals):
+        """
+        Replaces all the counters at once.
+        :param totals: list of (project, undone, lost, done)
+        """
+        counts = {project.value: list(counters)
+                  for project, *counters in totals}
+        self.beginResetModel()
+        for item in self.items:
+            item[1:] = counts.get(item[0], [0, 0, 0])
+        self.endResetModel()
+
+
+class TrendModel(BaseTaBleModel):
+    headers = ["Period", "Project", "Done", "Lost", "Open"]
 
-    def add(self, project, pos):
-        for row in range(self.rowCount()):
-            if self.index(row, 0).data() == project.value:
-                old_val = self.index(row, pos).data()
-                self.setData(self.index(row, pos), old_val + 1)
-                break
+    def __init__(self):
+        super(TrendModel, self).__init__(self.headers)
+
+    def set_trend(self, trend):
+        self.set_items((str(period), project.value, done, lost, open_tasks)
+                       for period, project, done, lost, open_tasks in trend)
 
 
 class Report(Ui_Dialog, QDialog):
@@ -60,18 +106,27 @@ class Report(Ui_Dialog, QDialog):
         self.reportBtn.clicked.connect(self.report_requested)
 
         self.taskModel = TaskModel()
-        self.proxyModel = QSortFilterProxyModel()
-        self.proxyModel.setSourceModel(self.taskModel)
-        self.taskTable.setModel(self.proxyModel)
+        self.taskTable.setModel(self.taskModel)
 
         self.reportModel = ReportModel()
         self.totalTable.setModel(self.reportModel)
 
+        # Trend view reads the daily summary instead of the raw history
+        self.trendPeriod = QComboBox(self)
+        self.trendPeriod.addItems(["week", "month", "day"])
+        self.horizontalLayout.insertWidget(5, self.trendPeriod)
+        self.trendModel = TrendModel()
+        self.trendTable = QTableView(self)
+        self.trendTable.setModel(self.trendModel)
+        self.gridLayout.addWidget(self.trendTable, 3, 0, 1, 1)
+
         self.taskTable.setSortingEnabled(True)
         self.taskTable.horizontalHeader()\
             .setSectionResizeMode(0, QHeaderView.Stretch)
         self.totalTable.horizontalHeader()\
             .setSectionResizeMode(0, QHeaderView.Stretch)
+        self.trendTable.horizontalHeader()\
+            .setSectionResizeMode(1, QHeaderView.Stretch)
 
         today = QDate.currentDate()
         self.fromEdit.setDate(today)
@@ -80,39 +135,11 @@ class Report(Ui_Dialog, QDialog):
     def report_requested(self):
         start = self.fromEdit.date().toPyDate()
         finish = self.toEdit.date().toPyDate()
-        tasks = self.storage.select_tasks_for_report(start, finish)
-
-        self.taskModel.removeRows(0, self.taskModel.rowCount())
-        self.reportModel.init()
-
-        for task in tasks:
-            (task, text, project, to_stage, to_date, valid, deadline) = task
-            stages = self.storage.select_stages(task, finish, to_stage)
-            # There is only one stage for the task
-            if len(stages) == 0:
-                from_stage = to_stage
-                from_date = to_date
-            # There are only two stages for the task
-            elif len(stages) == 1:
-                from_stage = stages[0][0]
-                from_date = stages[0][1]
-            else:
-                # If the stage came before start date use that stage
-                before = [i for i in stages if i[1] < start]
-                if len(before) > 0:
-                    from_stage = before[-1][0]
-                    from_date = before[-1][1]
-                # Use the first stage of the task
-                else:
-                    from_stage = stages[0][0]
-                    from_date = stages[0][1]
-
-            self.taskModel.insertRows(0, 1)
-            self.taskModel.setRowData(0, (text, project, from_stage,
-                                          from_date, to_stage, to_date,
-                                          valid, deadline))
-            self.reportModel.add(project, 1)
-            if to_stage == Stages.Done:
-                self.reportModel.add(project, 3)
-            elif valid is not None and valid <= to_date:
-                self.reportModel.add(project, 2)
\ No newline at end of file
+        tasks = self.storage.select_report(start, finish)
+
+        self.taskModel.set_tasks(tasks)
+        self.reportModel.set_totals(
+            self.storage.select_report_totals(start, finish))
+        if self.storage.daily_stats_ready():
+            self.trendModel.set_trend(self.storage.select_trend(
+                start, finish, self.trendPeriod.currentText()))
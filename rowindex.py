@@ -0,0 +1,122 @@
+import bisect
+import itertools
+
+
+class RowIndex:
+    """
+    Ordered sequence of unique task ids with fast row lookup.
+    Ids live in blocks of bounded size and every id knows its block,
+    so finding, inserting or removing a row touches one block plus
+    the block offsets, which are recomputed lazily after a change.
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, task_ids=()):
+        task_ids = list(task_ids)
+        self.__blocks = [task_ids[i:i + self.BLOCK_SIZE]
+                         for i in range(0, len(task_ids), self.BLOCK_SIZE)]
+        self.__block_of = {task_id: block for block in self.__blocks
+                           for task_id in block}
+        self.__length = len(task_ids)
+        # Row of the first id of every block, only the first
+        # self.__valid entries are up to date.
+        self.__starts = [0] * len(self.__blocks)
+        self.__valid = min(len(self.__blocks), 1)
+        # Position of every block in the list
+        self.__order = {id(block): i for i, block in enumerate(self.__blocks)}
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.__blocks)
+
+    def __contains__(self, task_id):
+        return task_id in self.__block_of
+
+    def __getitem__(self, row):
+        block, offset, _ = self.__locate(row)
+        return block[offset]
+
+    def __setitem__(self, row, task_id):
+        block, offset, _ = self.__locate(row)
+        del self.__block_of[block[offset]]
+        block[offset] = task_id
+        self.__block_of[task_id] = block
+
+    def index(self, task_id):
+        """
+        Returns the row of the task, raises ValueError like list.index.
+        """
+        block = self.__block_of.get(task_id)
+        if block is None:
+            raise ValueError("{} is not in the list".format(task_id))
+        position = self.__order[id(block)]
+        self.__update_starts(position)
+        return self.__starts[position] + block.index(task_id)
+
+    def insert(self, row, task_id):
+        if not self.__blocks:
+            self.__blocks.append([])
+            self.__starts.append(0)
+            self.__valid = 1
+            self.__order[id(self.__blocks[0])] = 0
+        if row >= self.__length:
+            position = len(self.__blocks) - 1
+            block = self.__blocks[position]
+            offset = len(block)
+        else:
+            block, offset, position = self.__locate(max(row, 0))
+        block.insert(offset, task_id)
+        self.__block_of[task_id] = block
+        self.__length += 1
+        self.__valid = min(self.__valid, position + 1)
+
+        if len(block) > 2 * self.BLOCK_SIZE:
+            tail = block[self.BLOCK_SIZE:]
+            del block[self.BLOCK_SIZE:]
+            for moved in tail:
+                self.__block_of[moved] = tail
+            self.__blocks.insert(position + 1, tail)
+            self.__starts.insert(position + 1, 0)
+            self.__reorder()
+
+    def pop(self, row):
+        block, offset, position = self.__locate(row)
+        task_id = block.pop(offset)
+        del self.__block_of[task_id]
+        self.__length -= 1
+        self.__valid = min(self.__valid, position + 1)
+        if not block:
+            del self.__blocks[position]
+            del self.__starts[position]
+            if self.__starts:
+                self.__starts[0] = 0
+            self.__valid = min(self.__valid, max(position, 1))
+            self.__reorder()
+        return task_id
+
+    def __locate(self, row):
+        """
+        Returns the block holding the row, offset in it and its position.
+        """
+        if row < 0:
+            row += self.__length
+        if not 0 <= row < self.__length:
+            raise IndexError("row out of range")
+        # Extend the valid offsets until they cover the row
+        last = self.__valid - 1
+        while self.__starts[last] + len(self.__blocks[last]) <= row:
+            last += 1
+            self.__update_starts(last)
+        position = bisect.bisect_right(self.__starts, row, 0, last + 1) - 1
+        return self.__blocks[position], row - self.__starts[position], position
+
+    def __update_starts(self, position):
+        for i in range(self.__valid, position + 1):
+            self.__starts[i] = self.__starts[i - 1] + len(self.__blocks[i - 1])
+        self.__valid = max(self.__valid, position + 1)
+
+    def __reorder(self):
+        self.__order = {id(block): i for i, block in enumerate(self.__blocks)}
@@ -0,0 +1,105 @@
+import calendar
+import datetime
+import logging
+
+from enums import Generators
+
+
+def due_dates(gen_type, day, last_date, today):
+    """
+    Returns the dates the generator has to produce tasks for.
+    Dates form an arithmetic sequence after the last generated date,
+    so they are computed directly instead of walking every day.
+    :param gen_type: Generators member.
+    :param day: rate in days for Daily, day of month for Monthly.
+    :param last_date: date of the last generated task or None.
+    :param today:
+    :return: list of dates not later than today.
+    """
+    if gen_type == Generators.Daily:
+        if last_date is None:
+            return [today]
+        count = max((today - last_date).days, 0) // day
+        return [last_date + datetime.timedelta(days=day * i)
+                for i in range(1, count + 1)]
+
+    elif gen_type == Generators.Monthly:
+        if last_date is None:
+            first = month_day(today.year, today.month, day)
+            return [first] if first <= today else []
+        months = (today.year - last_date.year) * 12 \
+            + today.month - last_date.month
+        dates = []
+        for i in range(1, months + 1):
+            year, month = divmod(last_date.month - 1 + i, 12)
+            dates.append(month_day(last_date.year + year, month + 1, day))
+        if dates and dates[-1] > today:
+            dates.pop()
+        return dates
+
+    return []
+
+
+def month_day(year, month, day):
+    """
+    Returns the day of the month, the last day when the month is shorter.
+    """
+    return datetime.date(year, month,
+                         min(day, calendar.monthrange(year, month)[1]))
+
+
+def task_dates(baseline_date, valid_days, deadline_days):
+    """
+    Returns valid and deadline dates of the generated task.
+    """
+    valid = None
+    deadline = None
+    if valid_days != '' and valid_days is not None:
+        valid = baseline_date + datetime.timedelta(days=valid_days)
+    if deadline_days != '' and deadline_days is not None:
+        deadline = baseline_date + datetime.timedelta(days=deadline_days)
+    return valid, deadline
+
+
+def catch_up(storage, today=None):
+    """
+    Generates all the tasks the generators missed up to today.
+    Everything is written in one transaction.
+    :param storage:
+    :param today:
+    :return: list of (task_id, project, stage, text, valid, deadline, date)
+    for every generated task.
+    """
+    with storage.transaction():
+        return [record for batch in iter_catch_up(storage, today)
+                for record in batch]
+
+
+def iter_catch_up(storage, today=None):
+    """
+    Same as catch_up, but yields the tasks of each generator as soon as
+    they are written. Each batch is committed on its own unless
+    the caller holds a transaction.
+    """
+    if today is None:
+        today = datetime.date.today()
+
+    for generator in storage.select_generators():
+        logging.info("Going to use generator: %s", generator)
+        gen_id, gen_type, day, text, project, stage, \
+            valid_days, deadline_days, last_date = generator
+        logging.info("Last date for %s: %s", gen_type, last_date)
+
+        rows = []
+        for date in due_dates(gen_type, day, last_date, today):
+            valid, deadline = task_dates(date, valid_days, deadline_days)
+            rows.append((text, project, stage, valid, deadline,
+                         gen_id, date))
+        if not rows:
+            continue
+
+        logging.info("Generating %d tasks", len(rows))
+        task_ids = storage.add_tasks(rows)
+        yield [(task_id, project, stage, text, valid, deadline, date)
+               for task_id, (text, project, stage, valid, deadline,
+                             gen_id, date) in zip(task_ids, rows)]
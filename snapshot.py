@@ -0,0 +1,80 @@
+import os
+import json
+import contextlib
+import logging
+import datetime
+
+from enums import Stages, Projects
+
+# Bump when the layout of the file changes
+VERSION = 1
+
+
+def save(path, changes, today, tasks, cells):
+    """
+    Writes the board to the snapshot file, replacing the old one at once.
+    :param changes: Storage.change_counter() the board is current with.
+    :param today: the day the board was built for.
+    :param tasks: (task_id, project, stage, text, valid, deadline,
+    truncated) of every task on the board.
+    :param cells: (stage, project, task_ids, last_id, exhausted)
+    of every cell.
+    """
+    data = {
+        "version": VERSION,
+        "changes": changes,
+        "date": today.toordinal(),
+        "tasks": [(task_id, project.name, stage.name, text,
+                   valid and valid.toordinal(),
+                   deadline and deadline.toordinal(), truncated)
+                  for task_id, project, stage, text, valid, deadline,
+                  truncated in tasks],
+        "cells": [(stage.name, project.name, task_ids, last_id, exhausted)
+                  for stage, project, task_ids, last_id, exhausted in cells],
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as snapshot_file:
+        json.dump(data, snapshot_file, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def load(path, changes, today):
+    """
+    Reads the snapshot if it was taken at the given change counter and day.
+    A stale or unreadable snapshot is deleted if possible, it never costs
+    more than a normal board load.
+    :return: (tasks, cells) as passed to save, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as snapshot_file:
+            data = json.load(snapshot_file)
+        if data["version"] != VERSION or data["changes"] != changes \
+                or data["date"] != today.toordinal():
+            logging.info("Snapshot is stale, discarding it")
+            _discard(path)
+            return None
+
+        tasks = [(task_id, Projects[project], Stages[stage], text,
+                  _to_date(valid), _to_date(deadline), truncated)
+                 for task_id, project, stage, text, valid, deadline,
+                 truncated in data["tasks"]]
+        cells = [(Stages[stage], Projects[project], task_ids, last_id,
+                  exhausted)
+                 for stage, project, task_ids, last_id, exhausted
+                 in data["cells"]]
+        return tasks, cells
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.exception(e)
+        _discard(path)
+        return None
+
+
+def _discard(path):
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+def _to_date(ordinal):
+    return datetime.date.fromordinal(ordinal) if ordinal else None
@@ -1,14 +1,311 @@
 import sqlite3
 import datetime
+import contextlib
 
 import enums
+import tracing
+
+
+def _create_tables(db_cursor):
+    """
+    Initial schema, matches databases created before versioning.
+    """
+    db_cursor.execute("""CREATE TABLE IF NOT EXISTS Tasks(
+    taskid INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT,
+    project PROJECT,
+    valid DATE,
+    deadline DATE,
+    generated_by INTEGER)""")
+
+    db_cursor.execute("""CREATE TABLE IF NOT EXISTS TimeLog(
+    stage STAGE,
+    date DATE,
+    task INTEGER,
+    FOREIGN KEY(task) REFERENCES Tasks(taskid) ON DELETE CASCADE)""")
+
+    db_cursor.execute("""CREATE TABLE IF NOT EXISTS Generators(
+    genid INTEGER PRIMARY KEY AUTOINCREMENT,
+    type GENERATOR,
+    day INTEGER,
+    text TEXT,
+    project PROJECT,
+    stage STAGE,
+    valid INTEGER,
+    deadline INTEGER
+    )""")
+
+
+def _create_indexes(db_cursor):
+    """
+    Indexes for the stage history lookups.
+    TimeLog(task, stage, date) covers the per task history scans and the
+    cascade delete, rowid is part of every index so it also serves
+    the "latest row per task" joins. TimeLog(date) serves date ranges.
+    """
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TimeLogByTask
+    ON TimeLog(task, stage, date)""")
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TimeLogByDate
+    ON TimeLog(date)""")
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TasksByGenerator
+    ON Tasks(generated_by)""")
+
+
+def _add_current_stage(db_cursor):
+    """
+    Keeps the latest stage of the task and its date on the task row,
+    as well as the date of the first stage, so the board and generators
+    do not have to search TimeLog for them. TimeLog stays the history.
+    """
+    db_cursor.execute("ALTER TABLE Tasks ADD COLUMN stage STAGE")
+    db_cursor.execute("ALTER TABLE Tasks ADD COLUMN stage_date DATE")
+    db_cursor.execute("ALTER TABLE Tasks ADD COLUMN created DATE")
+    db_cursor.execute("""UPDATE Tasks SET
+    stage = (SELECT stage FROM TimeLog WHERE task=taskid
+             ORDER BY rowid DESC LIMIT 1),
+    stage_date = (SELECT date FROM TimeLog WHERE task=taskid
+                  ORDER BY rowid DESC LIMIT 1),
+    created = (SELECT date FROM TimeLog WHERE task=taskid
+               ORDER BY rowid LIMIT 1)""")
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TasksByStage
+    ON Tasks(stage, stage_date)""")
+    db_cursor.execute("DROP INDEX IF EXISTS TasksByGenerator")
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TasksByGenerator
+    ON Tasks(generated_by, created)""")
+
+
+def _add_last_generated(db_cursor):
+    """
+    Stores the date of the last generated task on the generator row.
+    """
+    db_cursor.execute("ALTER TABLE Generators ADD COLUMN last_generated DATE")
+    db_cursor.execute("""UPDATE Generators SET
+    last_generated = (SELECT MAX(created) FROM Tasks
+                      WHERE generated_by=genid)""")
+
+
+def _add_daily_stats(db_cursor):
+    """
+    Per day, project and stage counters of the stage flow:
+    tasks that entered and left the stage that day, and tasks that
+    expired that day while sitting in the stage.
+    The table is filled by Storage.rebuild_daily_stats.
+    """
+    db_cursor.execute("""CREATE TABLE IF NOT EXISTS Meta(
+    key TEXT PRIMARY KEY,
+    value)""")
+    db_cursor.execute("""CREATE TABLE IF NOT EXISTS DailyStats(
+    day DATE,
+    project PROJECT,
+    stage STAGE,
+    entered INTEGER NOT NULL DEFAULT 0,
+    exited INTEGER NOT NULL DEFAULT 0,
+    lost INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(day, project, stage)) WITHOUT ROWID""")
+
+
+def _encode_enums(db_cursor):
+    """
+    Replaces "Name;Value" strings in enum columns with integer codes.
+    """
+    columns = [
+        ("Tasks", "project", enums.Projects),
+        ("Tasks", "stage", enums.Stages),
+        ("TimeLog", "stage", enums.Stages),
+        ("Generators", "type", enums.Generators),
+        ("Generators", "project", enums.Projects),
+        ("Generators", "stage", enums.Stages),
+        ("DailyStats", "project", enums.Projects),
+        ("DailyStats", "stage", enums.Stages),
+    ]
+    for table, column, enumeration in columns:
+        cases = " ".join("WHEN ? THEN ?" for _ in enumeration)
+        params = []
+        for en in enumeration:
+            params += [enums.legacy_name(en), enums.adapt_enum(en)]
+        db_cursor.execute("""UPDATE {0}
+        SET {1} = CASE {1} {2} ELSE {1} END
+        """.format(table, column, cases), params)
+
+
+def _add_cell_index(db_cursor):
+    """
+    Serves the pages of a single board cell, newest tasks first.
+    """
+    db_cursor.execute("""CREATE INDEX IF NOT EXISTS TasksByCell
+    ON Tasks(stage, project, taskid)""")
+
+
+def _add_text_search(db_cursor):
+    """
+    Full-text index over task texts, including the completed ones.
+    It stores no copy of the texts, triggers keep it in sync with Tasks.
+    Prefix indexes make the search as you type cheap.
+    """
+    db_cursor.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS TasksText
+    USING fts5(text, content='Tasks', content_rowid='taskid',
+    prefix='2 3')""")
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS TasksTextInsert
+    AFTER INSERT ON Tasks BEGIN
+        INSERT INTO TasksText(rowid, text) VALUES (new.taskid, new.text);
+    END""")
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS TasksTextDelete
+    AFTER DELETE ON Tasks BEGIN
+        INSERT INTO TasksText(TasksText, rowid, text)
+        VALUES ('delete', old.taskid, old.text);
+    END""")
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS TasksTextUpdate
+    AFTER UPDATE OF text ON Tasks BEGIN
+        INSERT INTO TasksText(TasksText, rowid, text)
+        VALUES ('delete', old.taskid, old.text);
+        INSERT INTO TasksText(rowid, text) VALUES (new.taskid, new.text);
+    END""")
+    db_cursor.execute("INSERT INTO TasksText(TasksText) VALUES ('rebuild')")
+
+
+def _add_change_counter(db_cursor):
+    """
+    Persistent counter of changes to Tasks, bumped by triggers, so
+    anything cached from the tasks can tell whether it is still current.
+    """
+    db_cursor.execute("INSERT OR IGNORE INTO Meta VALUES('changes', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS TasksChanged{0}
+        AFTER {1} ON Tasks BEGIN
+            UPDATE Meta SET value = value + 1 WHERE key = 'changes';
+        END""".format(event.title(), event))
+
+
+def _match_expression(query):
+    """
+    Turns the words typed by the user into an FTS5 query that matches
+    tasks containing every word, each as a prefix.
+    """
+    return " ".join('"{}"*'.format(word.replace('"', '""'))
+                    for word in query.split())
+
+
+# Connection tuning presets, picked by name in config.db_profile.
+PROFILES = {
+    # Survives power loss at the cost of an fsync per commit.
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+    },
+    # WAL with NORMAL sync never corrupts the DB, last commits may be lost.
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+    # Leaves flushing to the OS, for throwaway or easily rebuilt DBs.
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+# Schema migrations, the position in the list is the schema version.
+# Never edit or reorder released entries, append new ones instead.
+MIGRATIONS = [
+    _create_tables,
+    _create_indexes,
+    _add_current_stage,
+    _add_last_generated,
+    _add_daily_stats,
+    _encode_enums,
+    _add_cell_index,
+    _add_text_search,
+    _add_change_counter,
+]
+
+
+# Stage history up to :finish and the latest stage of each task in it.
+# Rows are ordered by rowid, the order stages were set in.
+REPORT_LOG = """WITH
+stage_log AS (
+    SELECT rowid AS rid, task, stage, date FROM TimeLog
+    WHERE date <=:finish),
+last_stage AS (
+    SELECT task, stage, date FROM (
+        SELECT task, stage, date, ROW_NUMBER() OVER (
+            PARTITION BY task ORDER BY rid DESC) AS n
+        FROM stage_log)
+    WHERE n = 1)
+"""
+
+# Adds the DailyStats counters of the tasks :first..:last
+# multiplied by :sign, so the same statement applies and retracts them.
+DAILY_STATS_DELTA = """WITH
+history AS (
+    SELECT l.stage, l.date, t.project, LAG(l.stage) OVER (
+        PARTITION BY l.task ORDER BY l.rowid) AS prev
+    FROM TimeLog l
+    INNER JOIN Tasks t ON l.task=t.taskid
+    WHERE l.task BETWEEN :first AND :last),
+deltas AS (
+    SELECT date AS day, project, stage,
+    1 AS entered, 0 AS exited, 0 AS lost
+    FROM history
+    UNION ALL
+    SELECT date, project, prev, 0, 1, 0
+    FROM history WHERE prev IS NOT NULL
+    UNION ALL
+    SELECT valid, project, stage, 0, 0, 1
+    FROM Tasks
+    WHERE taskid BETWEEN :first AND :last
+    AND valid IS NOT NULL
+    AND NOT (stage =:done AND stage_date <= valid))
+INSERT INTO DailyStats(day, project, stage, entered, exited, lost)
+SELECT day, project, stage,
+:sign * SUM(entered), :sign * SUM(exited), :sign * SUM(lost)
+FROM deltas
+WHERE true
+GROUP BY day, project, stage
+ON CONFLICT(day, project, stage) DO UPDATE SET
+entered = entered + excluded.entered,
+exited = exited + excluded.exited,
+lost = lost + excluded.lost
+"""
 
 
 class Storage:
-    def __init__(self, db_path):
+    # Trace file of the connections opened without one
+    default_trace = None
+
+    def __init__(self, db_path, batch_size=1, profile=None, trace=None):
+        """
+        :param db_path:
+        :param batch_size: number of write operations per commit.
+        With the default every operation is committed at once, bigger
+        values keep writes pending until the batch is full or flush()
+        is called.
+        :param profile: name of the connection preset from PROFILES,
+        None keeps SQLite defaults.
+        :param trace: JSON lines file to trace every statement to,
+        see tracing.py. Storage.default_trace when None.
+        """
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.__pending = 0
+        self.__depth = 0
         # Adding support for custom types in DB.
-        self.db_conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+        if trace is None:
+            trace = self.default_trace
+        factory = sqlite3.Connection
+        if trace is not None:
+            factory = tracing.connection_factory(trace)
+        self.db_conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                       factory=factory)
         sqlite3.register_adapter(enums.Projects, enums.adapt_enum)
         sqlite3.register_converter(
             "PROJECT", enums.convert_enum(enums.Projects))
@@ -19,35 +316,12 @@ class Storage:
         sqlite3.register_converter(
             "GENERATOR", enums.convert_enum(enums.Generators))
 
-        # Initialize tables
         self.db_cursor = self.db_conn.cursor()
-        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS Tasks(
-        taskid INTEGER PRIMARY KEY AUTOINCREMENT,
-        text TEXT,
-        project PROJECT,
-        valid DATE,
-        deadline DATE,
-        generated_by INTEGER)""")
-        self.db_conn.commit()
+        if profile is not None:
+            self.apply_profile(PROFILES[profile])
 
-        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS TimeLog(
-        stage STAGE,
-        date DATE,
-        task INTEGER,
-        FOREIGN KEY(task) REFERENCES Tasks(taskid) ON DELETE CASCADE)""")
-        self.db_conn.commit()
-
-        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS Generators(
-        genid INTEGER PRIMARY KEY AUTOINCREMENT,
-        type GENERATOR,
-        day INTEGER,
-        text TEXT,
-        project PROJECT,
-        stage STAGE,
-        valid INTEGER,
-        deadline INTEGER
-        )""")
-        self.db_conn.commit()
+        # Bring the schema up to date
+        self.migrate()
 
         # Enabling foreign key support
         self.db_cursor.execute("""
@@ -55,21 +329,173 @@ class Storage:
         """)
         self.db_conn.commit()
 
-    def add_task(self, text, project, stage, valid, deadline,
-                 gen_id=None, date=None):
+    def apply_profile(self, settings):
+        """
+        Sets connection pragmas, must be called outside of a transaction.
+        """
+        for pragma in ("journal_mode", "synchronous", "mmap_size",
+                       "cache_size", "temp_store"):
+            if pragma in settings:
+                self.db_cursor.execute("PRAGMA {} = {}".format(
+                    pragma, settings[pragma]))
+                self.db_cursor.fetchall()
+
+    def schema_version(self):
+        """
+        Returns the schema version stored in the DB file.
+        """
+        self.db_cursor.execute("PRAGMA user_version")
+        return self.db_cursor.fetchone()[0]
+
+    def migrate(self):
+        """
+        Applies every migration newer than the schema version of the DB.
+        Each migration runs in its own transaction together with the
+        version bump, so an interrupted upgrade leaves the file at the
+        last complete version. Statistics are refreshed after each step.
+        """
+        current = self.schema_version()
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            if version <= current:
+                continue
+            self.db_cursor.execute("BEGIN")
+            try:
+                migration(self.db_cursor)
+                self.db_cursor.execute(
+                    "PRAGMA user_version = {}".format(version))
+            except Exception:
+                self.db_conn.rollback()
+                raise
+            self.db_conn.commit()
+            self.db_cursor.execute("ANALYZE")
+            self.db_conn.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Groups several write operations into one commit.
+        Transactions can be nested, only the outermost one commits,
+        at once even in the batched mode.
+        Any exception rolls back the whole transaction.
+        Pending writes of the batched mode are committed first,
+        so a rollback only loses the writes of the block.
+        """
+        if self.__depth == 0:
+            if self.db_conn.in_transaction:
+                self.flush()
+            self.db_conn.execute("BEGIN IMMEDIATE")
+        self.__depth += 1
+        try:
+            yield self
+        except Exception:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.db_conn.rollback()
+                self.__pending = 0
+            raise
+        else:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.flush()
+
+    def __commit(self):
+        """
+        Commits the write unless it is a part of the transaction
+        or the current batch is not full yet.
+        """
+        if self.__depth > 0:
+            return
+        self.__pending += 1
+        if self.__pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits pending writes of the batched mode.
+        """
+        if self.__depth > 0:
+            return
+        self.db_conn.commit()
+        self.__pending = 0
+
+    def close(self):
+        self.flush()
+        self.db_conn.close()
+
+    def add_task(self, text, project, stage, valid, deadline, date=None):
+        """
+        Inserts a task made by hand, generated tasks go through add_tasks,
+        which also moves the last generated date of their generators.
+        """
+        if not date:
+            date = datetime.date.today()
         db_cursor = self.db_conn.cursor()
 
         db_cursor.execute("""INSERT INTO Tasks(text, project, valid,
-        deadline, generated_by)
-        VALUES(?,?,?,?,?)
-        """, (text, project, valid, deadline, gen_id))
-        self.db_conn.commit()
+        deadline, stage, stage_date, created)
+        VALUES(?,?,?,?,?,?,?)
+        """, (text, project, valid, deadline, stage, date, date))
         rowid = db_cursor.lastrowid
-
-        self.set_new_stage(rowid, stage, date)
+        db_cursor.execute("""INSERT INTO Timelog
+        VALUES(?,?,?)
+        """, (stage, date, rowid))
+        self.__update_daily_stats(rowid, rowid, 1)
+        self.__commit()
 
         return rowid
 
+    def add_tasks(self, rows):
+        """
+        Inserts many tasks with their first stage at once.
+        :param rows: list of (text, project, stage, valid, deadline,
+        gen_id, date) tuples.
+        :return: list of ids of the new tasks in the order of rows.
+        """
+        with self.transaction():
+            db_cursor = self.db_conn.cursor()
+            # The write lock is held, so the ids can be assigned up front
+            # and both tables filled with executemany.
+            db_cursor.execute("""SELECT MAX(
+            IFNULL((SELECT seq FROM sqlite_sequence WHERE name='Tasks'), 0),
+            IFNULL((SELECT MAX(taskid) FROM Tasks), 0))
+            """)
+            first_id = db_cursor.fetchone()[0] + 1
+            task_ids = list(range(first_id, first_id + len(rows)))
+
+            # Tasks are staged and copied with one statement, the full-text
+            # triggers are much slower when every row is its own statement.
+            db_cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS NewTasks(
+            taskid INTEGER PRIMARY KEY, text, project, valid, deadline,
+            generated_by, stage, stage_date, created)""")
+            db_cursor.executemany("""INSERT INTO NewTasks
+            VALUES(?,?,?,?,?,?,?,?,?)
+            """, ((task_id, text, project, valid, deadline, gen_id,
+                   stage, date, date)
+                  for task_id, (text, project, stage, valid, deadline,
+                                gen_id, date) in zip(task_ids, rows)))
+            db_cursor.execute("""INSERT INTO Tasks(taskid, text, project,
+            valid, deadline, generated_by, stage, stage_date, created)
+            SELECT * FROM NewTasks ORDER BY taskid""")
+            db_cursor.execute("DELETE FROM NewTasks")
+            db_cursor.executemany("""INSERT INTO Timelog
+            VALUES(?,?,?)
+            """, ((row[2], row[6], task_id)
+                  for task_id, row in zip(task_ids, rows)))
+            if task_ids:
+                self.__update_daily_stats(task_ids[0], task_ids[-1], 1)
+
+            last_dates = {}
+            for *_, gen_id, date in rows:
+                if gen_id is not None:
+                    last_dates[gen_id] = max(date, last_dates.get(gen_id, date))
+            db_cursor.executemany("""UPDATE Generators
+            SET last_generated=?
+            WHERE genid=?
+            AND (last_generated IS NULL OR last_generated < ?)
+            """, ((date, gen_id, date) for gen_id, date in last_dates.items()))
+
+        return task_ids
+
     def add_generator(self, gen_type, shift, text, project, stage,
                       valid, dealine):
 
@@ -79,31 +505,89 @@ class Storage:
         stage, valid, deadline)
         VALUES(?,?,?,?,?,?,?)
         """, (gen_type, shift, text, project, stage, valid, dealine))
-        self.db_conn.commit()
+        self.__commit()
         gen_id = db_cursor.lastrowid
 
         return gen_id
 
-    def select_tasks_for_today(self):
+    def select_cell_tasks(self, stage, project, before=None, limit=100,
+                          preview=None):
         """
-        Returns tasks that fit for today.
-        1) valid for today
-        2) not completed before today
-        3) returned stage is the latest stage for the task
+        Returns a page of the tasks for today in one board cell,
+        newest first.
+        :param before: only tasks with smaller ids, the last id
+        of the previous page.
+        :param limit: page size.
+        :param preview: if given, texts are cut to that many characters
+        and the last column tells whether the text was cut.
         """
         today = datetime.date.today()
+        if before is None:
+            before = 2 ** 63 - 1
+        # Done keeps the whole history, only today's part is on the board
+        if stage == enums.Stages.Done:
+            index = "TasksByStage"
+        else:
+            index = "TasksByCell"
+        if preview is None:
+            columns = "text, valid, deadline"
+        else:
+            columns = "substr(text, 1, :preview), valid, deadline, " \
+                "length(text) >:preview"
         db_cursor = self.db_conn.cursor()
         db_cursor.execute("""SELECT
-        m1.task, t.project, m1.stage, t.text, t.valid, t.deadline
-        FROM Timelog m1
-        LEFT JOIN TimeLog m2 ON (m1.task = m2.task AND m1.rowid < m2.rowid)
-        INNER JOIN Tasks t ON m1.task=t.taskid
-        WHERE m2.rowid IS NULL
-        AND (t.valid >= ? OR t.valid is NULL)
-        AND NOT (m1.stage = ? AND m1.date < ?)""",
-                          (today, enums.Stages.Done, today))
+        taskid, project, stage, {}
+        FROM Tasks INDEXED BY {}
+        WHERE stage =:stage AND project =:project AND taskid <:before
+        AND (stage <>:done OR stage_date >=:today)
+        AND (valid >=:today OR valid is NULL)
+        ORDER BY taskid DESC
+        LIMIT :limit
+        """.format(columns, index), {"stage": stage, "project": project,
+                                     "before": before, "limit": limit,
+                                     "preview": preview, "today": today,
+                                     "done": enums.Stages.Done})
         return db_cursor.fetchall()
 
+    def select_task_text(self, task_id):
+        """
+        Returns the full text of the task.
+        """
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("SELECT text FROM Tasks WHERE taskid =?", (task_id,))
+        row = db_cursor.fetchone()
+        return row[0] if row else None
+
+    def iter_tasks(self):
+        """
+        Iterates over every task with its current stage, oldest first.
+        Rows are read lazily, so large exports stay in constant memory.
+        :return: cursor of (taskid, text, project, stage, stage_date,
+        created, valid, deadline, generated_by)
+        """
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("""SELECT
+        taskid, text, project, stage, stage_date, created,
+        valid, deadline, generated_by
+        FROM Tasks
+        ORDER BY taskid""")
+        return db_cursor
+
+    def search_task_ids(self, query):
+        """
+        Returns the ids of all tasks whose text contains every word
+        of the query. Completed and expired tasks are included.
+        Reads the full-text index only, cheap even for common words.
+        :param query: words typed by the user, each matches as a prefix.
+        """
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("""SELECT rowid FROM TasksText
+        WHERE TasksText MATCH ?""", (expression,))
+        return [row[0] for row in db_cursor]
+
     def select_tasks_for_report(self, start, finish):
         """
         1) valid in between start and finish date
@@ -112,61 +596,164 @@ class Storage:
         4) returned stage is the latest stage for the task
         """
         db_cursor = self.db_conn.cursor()
-        db_cursor.execute("""SELECT
+        db_cursor.execute(REPORT_LOG + """SELECT
         m1.task, t.text, t.project, m1.stage, m1.date, t.valid, t.deadline
-        FROM ( SELECT * FROM TimeLog
-               WHERE date <=:finish
-               GROUP BY task) m1
+        FROM last_stage m1
         INNER JOIN Tasks t ON m1.task=t.taskid
         AND (t.valid >=:start OR t.valid is NULL)
         AND NOT (m1.stage =:done AND m1.date <:start)
         """, {"start": start, "finish": finish, "done": enums.Stages.Done})
         return db_cursor.fetchall()
 
-    def select_stages(self, task, finish, stage):
+    def select_report(self, start, finish):
         """
-        Returns stages for a given task excluding the given stage
-        and before the finish date.
+        Same tasks as select_tasks_for_report with the stage transition
+        they made. The "from" stage is the latest other stage before
+        the start date, or the first other stage if the task
+        changed only within the range, or the "to" stage itself.
+        :return: list of (task, text, project, from_stage, from_date,
+        to_stage, to_date, valid, deadline)
         """
         db_cursor = self.db_conn.cursor()
-        db_cursor.execute("""SELECT
-        stage, date FROM TimeLog
-        WHERE task=:task
-        AND date <=:finish
-        AND stage <>:stage
-        """, {"task": task, "finish": finish, "stage": stage})
-        return db_cursor.fetchall()
+        db_cursor.execute(REPORT_LOG + """,
+        first_stage AS (
+            SELECT task, stage, date FROM (
+                SELECT l.task, l.stage, l.date, ROW_NUMBER() OVER (
+                    PARTITION BY l.task
+                    ORDER BY l.date <:start DESC,
+                    CASE WHEN l.date <:start THEN -l.rid ELSE l.rid END
+                ) AS n
+                FROM stage_log l
+                INNER JOIN last_stage m ON l.task=m.task
+                WHERE l.stage <> m.stage)
+            WHERE n = 1)
+        SELECT
+        m1.task, t.text, t.project, f.stage, f.date, m1.stage, m1.date,
+        t.valid, t.deadline
+        FROM last_stage m1
+        INNER JOIN Tasks t ON m1.task=t.taskid
+        LEFT JOIN first_stage f ON m1.task=f.task
+        WHERE (t.valid >=:start OR t.valid is NULL)
+        AND NOT (m1.stage =:done AND m1.date <:start)
+        """, {"start": start, "finish": finish, "done": enums.Stages.Done})
+        report = []
+        for row in db_cursor:
+            # The task never left its only stage
+            if row[3] is None:
+                row = row[:3] + row[5:7] + row[5:]
+            report.append(row)
+        return report
 
-    def select_generators(self):
+    def select_report_totals(self, start, finish):
+        """
+        Counts the tasks of select_tasks_for_report per project.
+        :return: list of (project, undone, lost, done), "undone" counts
+        all the tasks of the project.
+        """
         db_cursor = self.db_conn.cursor()
-        db_cursor.execute("""SELECT *
-        FROM Generators
-        """, ())
+        db_cursor.execute(REPORT_LOG + """SELECT
+        t.project,
+        COUNT(*),
+        SUM(m1.stage <>:done AND t.valid IS NOT NULL AND t.valid <= m1.date),
+        SUM(m1.stage =:done)
+        FROM last_stage m1
+        INNER JOIN Tasks t ON m1.task=t.taskid
+        WHERE (t.valid >=:start OR t.valid is NULL)
+        AND NOT (m1.stage =:done AND m1.date <:start)
+        GROUP BY t.project
+        """, {"start": start, "finish": finish, "done": enums.Stages.Done})
         return db_cursor.fetchall()
 
-    def get_last_generated_date(self, gen_id):
+    def select_trend(self, start, finish, period="week"):
         """
-        Finds the list of dates where tasks has been generated,
-        return the last such date.
-        :param gen_id:
-        :return:
+        Reads the stage flow from DailyStats.
+        :param period: "day", "week" or "month".
+        :return: list of (period start, project, done, lost, open) for
+        every period with activity, "open" is the number of tasks outside
+        of the Done stage at the end of the period.
         """
+        periods = {
+            "day": "day",
+            "week": "date(day, '-6 days', 'weekday 1')",
+            "month": "date(day, 'start of month')",
+        }
         db_cursor = self.db_conn.cursor()
         db_cursor.execute("""SELECT
-        MAX(m1.date)
-        FROM Timelog m1
-        LEFT JOIN TimeLog m2 ON (m1.task = m2.task AND m1.rowid > m2.rowid)
-        INNER JOIN Tasks t ON m1.task=t.taskid
-        WHERE m2.rowid IS NULL
-        AND t.generated_by=?
-        """, (gen_id, ))
-        # Converting to datetime type because MAX() breaks the custom adapter.
-        last_date = db_cursor.fetchone()[0]
-        if last_date:
-            last_date = last_date.split('-')
-            last_date = [int(x) for x in last_date]
-            last_date = datetime.date(*last_date)
-        return last_date
+        project, SUM(entered - exited)
+        FROM DailyStats
+        WHERE day <:start AND stage <>:done
+        GROUP BY project
+        """, {"start": start, "done": enums.Stages.Done})
+        open_tasks = dict(db_cursor.fetchall())
+
+        db_cursor.execute("""SELECT
+        {} AS period, project,
+        SUM(CASE WHEN stage =:done THEN entered ELSE 0 END),
+        SUM(lost),
+        SUM(CASE WHEN stage <>:done THEN entered - exited ELSE 0 END)
+        FROM DailyStats
+        WHERE day BETWEEN :start AND :finish
+        GROUP BY period, project
+        ORDER BY period
+        """.format(periods[period]),
+                          {"start": start, "finish": finish,
+                           "done": enums.Stages.Done})
+        trend = []
+        for period_start, project, done, lost, change in db_cursor:
+            open_tasks[project] = open_tasks.get(project, 0) + change
+            trend.append((datetime.date.fromisoformat(str(period_start)),
+                          project, done, lost, open_tasks[project]))
+        return trend
+
+    def daily_stats_ready(self):
+        return self.get_meta("daily_stats") == "ready"
+
+    def rebuild_daily_stats(self):
+        """
+        Recomputes DailyStats from the whole TimeLog in one transaction.
+        """
+        with self.transaction():
+            self.db_conn.execute("DELETE FROM DailyStats")
+            self.__update_daily_stats(0, 2 ** 63 - 1, 1)
+            self.set_meta("daily_stats", "ready")
+
+    def __update_daily_stats(self, first, last, sign):
+        self.db_conn.execute(DAILY_STATS_DELTA, {
+            "first": first, "last": last, "sign": sign,
+            "done": enums.Stages.Done})
+
+    def change_counter(self):
+        """
+        Returns the number of changes ever made to Tasks.
+        """
+        return self.get_meta("changes")
+
+    def get_meta(self, key):
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("""SELECT value FROM Meta
+        WHERE key=?
+        """, (key, ))
+        row = db_cursor.fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("""INSERT OR REPLACE INTO Meta
+        VALUES(?,?)
+        """, (key, value))
+        self.__commit()
+
+    def select_generators(self):
+        """
+        Returns generators with the date of the last generated task
+        as the last column.
+        """
+        db_cursor = self.db_conn.cursor()
+        db_cursor.execute("""SELECT
+        genid, type, day, text, project, stage, valid, deadline, last_generated
+        FROM Generators
+        """, ())
+        return db_cursor.fetchall()
 
     def update_generator(self, gen_id, gen_type, shift, text, project, stage,
                       valid, dealine):
@@ -175,43 +762,54 @@ class Storage:
         SET type=?, day=?, text=?, project=?, stage=?, valid=?, deadline=?
         WHERE genid=?
         """, (gen_type, shift, text, project, stage, valid, dealine, gen_id))
-        self.db_conn.commit()
+        self.__commit()
 
     def set_new_stage(self, rowid, stage, date=None):
         if not date:
             date = datetime.date.today()
         db_cursor = self.db_conn.cursor()
+        self.__update_daily_stats(rowid, rowid, -1)
         db_cursor.execute("""INSERT INTO Timelog
         VALUES(?,?,?)
         """, (stage, date, rowid))
-        self.db_conn.commit()
+        db_cursor.execute("""UPDATE Tasks
+        SET stage=?, stage_date=?
+        WHERE taskid=?
+        """, (stage, date, rowid))
+        self.__update_daily_stats(rowid, rowid, 1)
+        self.__commit()
 
     def set_new_project(self, rowid, project):
         db_cursor = self.db_conn.cursor()
+        self.__update_daily_stats(rowid, rowid, -1)
         db_cursor.execute("""UPDATE Tasks
         SET project=?
         WHERE taskid=?
         """, (project, rowid))
-        self.db_conn.commit()
+        self.__update_daily_stats(rowid, rowid, 1)
+        self.__commit()
 
     def set_new_stats(self, rowid, text, project, valid, deadline):
         db_cursor = self.db_conn.cursor()
+        self.__update_daily_stats(rowid, rowid, -1)
         db_cursor.execute("""UPDATE Tasks
         SET project=?, text=?, valid=?, deadline=?
         WHERE taskid=?
         """, (project, text, valid, deadline, rowid))
-        self.db_conn.commit()
+        self.__update_daily_stats(rowid, rowid, 1)
+        self.__commit()
 
     def delete_task(self, rowid):
         db_cursor = self.db_conn.cursor()
+        self.__update_daily_stats(rowid, rowid, -1)
         db_cursor.execute("""DELETE FROM Tasks
         WHERE taskid=?
         """, (rowid, ))
-        self.db_conn.commit()
+        self.__commit()
 
     def delete_generator(self, gen_id):
         db_cursor = self.db_conn.cursor()
         db_cursor.execute("""DELETE FROM Generators
         WHERE genid=?
         """, (gen_id, ))
-        self.db_conn.commit()
\ No newline at end of file
+        self.__commit()
@@ -0,0 +1,132 @@
+"""
+Command line tools for cron and batch jobs, they never import Qt.
+Usage: python -m tasktools generate|report|export [--db PATH] [options]
+"""
+import argparse
+import datetime
+import logging
+import csv
+import sys
+import os
+
+import appdata
+import config
+import scheduler
+import storage
+
+
+def parse_date(text):
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected YYYY-MM-DD, got {!r}".format(text))
+
+
+def cell(value):
+    """
+    Formats a DB value for CSV, enums by their value, None as empty.
+    """
+    if value is None:
+        return ""
+    return getattr(value, "value", value)
+
+
+def write_rows(out, header, rows):
+    writer = csv.writer(out)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([cell(value) for value in row])
+
+
+def generate(db, args, out):
+    records = scheduler.catch_up(db, args.today)
+    print("{} tasks generated".format(len(records)), file=out)
+
+
+def report(db, args, out):
+    if args.start > args.finish:
+        raise SystemExit("start date is after finish date")
+    if args.totals:
+        write_rows(out, ("project", "undone", "lost", "done"),
+                   db.select_report_totals(args.start, args.finish))
+    elif args.trend:
+        if not db.daily_stats_ready():
+            db.rebuild_daily_stats()
+        write_rows(out, ("period", "project", "done", "lost", "open"),
+                   db.select_trend(args.start, args.finish, args.trend))
+    else:
+        write_rows(out, ("task", "text", "project", "from_stage",
+                         "from_date", "to_stage", "to_date", "valid",
+                         "deadline"),
+                   db.select_report(args.start, args.finish))
+
+
+def export(db, args, out):
+    write_rows(out, ("task", "text", "project", "stage", "stage_date",
+                     "created", "valid", "deadline", "generated_by"),
+               db.iter_tasks())
+
+
+def build_parser():
+    today = datetime.date.today()
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", help="DB file, the one of the app "
+                                     "by default")
+    common.add_argument("-o", "--output", help="write to the file "
+                                               "instead of stdout")
+    common.add_argument("--trace", help="write every SQL statement to "
+                                        "this JSON lines file")
+
+    parser = argparse.ArgumentParser(prog="tasktools", description=__doc__)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    command = commands.add_parser(
+        "generate", parents=[common],
+        help="create the tasks the generators missed")
+    command.add_argument("--today", type=parse_date, default=today,
+                         help="generate up to this date, YYYY-MM-DD")
+    command.set_defaults(run=generate)
+
+    command = commands.add_parser(
+        "report", parents=[common],
+        help="CSV report of the stage changes in a date range")
+    command.add_argument("--start", type=parse_date,
+                         default=today - datetime.timedelta(days=7))
+    command.add_argument("--finish", type=parse_date, default=today)
+    kind = command.add_mutually_exclusive_group()
+    kind.add_argument("--totals", action="store_true",
+                      help="per project counts instead of tasks")
+    kind.add_argument("--trend", choices=("day", "week", "month"),
+                      help="done, lost and open tasks per period")
+    command.set_defaults(run=report)
+
+    command = commands.add_parser("export", parents=[common],
+                                  help="CSV of every task")
+    command.set_defaults(run=export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(format='%(asctime)s %(message)s',
+                        level=logging.WARNING)
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(appdata.app_data_path(), config.dbname)
+    db = storage.Storage(db_path, profile=config.db_profile,
+                         trace=args.trace)
+    try:
+        if args.output:
+            with open(args.output, "w", newline="") as out:
+                args.run(db, args, out)
+        else:
+            args.run(db, args, sys.stdout)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Ranks the statements of a Storage trace by their total time.
+Usage: python tracereport.py trace.jsonl [--top N] [--plans]
+Statements whose plan scans all of Tasks or TimeLog are marked with "!".
+"""
+import argparse
+import json
+import sys
+
+
+class Statement:
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.executions = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.plan = []
+        self.full_scans = []
+
+    def add(self, record):
+        self.calls += 1
+        self.executions += record.get("executions", 1)
+        self.rows += max(record.get("rows", 0), 0)
+        self.total_ms += record["ms"]
+        self.max_ms = max(self.max_ms, record["ms"])
+
+
+def read_trace(trace_file):
+    """
+    Returns the statements of the trace by their text.
+    """
+    statements = {}
+    for number, line in enumerate(trace_file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print("line {}: not JSON, skipped".format(number),
+                  file=sys.stderr)
+            continue
+        statement = statements.get(record["sql"])
+        if statement is None:
+            statement = statements[record["sql"]] = Statement(record["sql"])
+        if record["type"] == "plan":
+            statement.plan = record["plan"]
+            statement.full_scans = record["full_scans"]
+        else:
+            statement.add(record)
+    return statements
+
+
+def print_report(statements, top, plans, width=80, out=sys.stdout):
+    ranked = sorted((s for s in statements.values() if s.calls),
+                    key=lambda s: s.total_ms, reverse=True)[:top]
+    grand_total = sum(s.total_ms for s in statements.values()) or 1.0
+
+    print("{:>4} {:>10} {:>6} {:>8} {:>9} {:>9} {:>8}  {}".format(
+        "#", "total ms", "share", "calls", "mean ms", "max ms", "rows",
+        "statement"), file=out)
+    for rank, statement in enumerate(ranked, start=1):
+        sql = statement.sql
+        if len(sql) > width:
+            sql = sql[:width - 3] + "..."
+        print("{:>4} {:>10.1f} {:>5.1f}% {:>8} {:>9.3f} {:>9.1f} {:>8} {}{}"
+              .format(rank, statement.total_ms,
+                      statement.total_ms / grand_total * 100,
+                      statement.calls, statement.total_ms / statement.calls,
+                      statement.max_ms, statement.rows,
+                      "!" if statement.full_scans else " ", sql), file=out)
+
+    scanning = [s for s in ranked if s.full_scans]
+    if scanning:
+        print("", file=out)
+        print("! full scans of Tasks or TimeLog:", file=out)
+        for statement in scanning:
+            print("  {} ({})".format(", ".join(statement.full_scans),
+                                     statement.sql[:width]), file=out)
+
+    if plans:
+        for rank, statement in enumerate(ranked, start=1):
+            print("", file=out)
+            print("#{} {}".format(rank, statement.sql), file=out)
+            for step in statement.plan or ["(no plan recorded)"]:
+                print("    " + step, file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("trace", help="JSON lines file written by tracing.py")
+    parser.add_argument("--top", type=int, default=20,
+                        help="number of statements to show")
+    parser.add_argument("--plans", action="store_true",
+                        help="print the query plan of every statement shown")
+    args = parser.parse_args(argv)
+
+    with open(args.trace, encoding="utf-8") as trace_file:
+        statements = read_trace(trace_file)
+    print_report(statements, args.top, args.plans)
+
+
+if __name__ == "__main__":
+    main()
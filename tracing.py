@@ -0,0 +1,274 @@
+"""
+Opt-in SQL tracing for Storage. Every statement is written to a
+JSON lines file with its parameters, row count and wall time, and the
+first run of each statement also records its EXPLAIN QUERY PLAN.
+Summarize a trace with "python tracereport.py trace.jsonl".
+"""
+import re
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+# Set TOOLBOX_TRACE to a file name to trace every connection of the app
+TRACE_ENV = "TOOLBOX_TRACE"
+
+# Statements EXPLAIN QUERY PLAN accepts
+EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# Big tables a full scan is flagged for
+BIG_TABLES = ("Tasks", "TimeLog")
+# Plan steps reading a whole table, "SCAN TABLE x" before SQLite 3.36
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+# Plans name tables by their alias, "FROM TimeLog l" shows as "SCAN l"
+TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+({})(?:\s+(?:AS\s+)?(\w+))?"
+                         .format("|".join(BIG_TABLES)), re.IGNORECASE)
+NOT_ALIASES = {"WHERE", "INNER", "LEFT", "CROSS", "NATURAL", "JOIN", "ON",
+               "USING", "GROUP", "ORDER", "LIMIT", "INDEXED", "NOT",
+               "WINDOW", "UNION", "EXCEPT", "INTERSECT", "SET", "VALUES"}
+# Long texts in parameters are cut to this many characters
+PARAM_LENGTH = 80
+
+
+class TraceFile:
+    """
+    Trace file shared by all connections and threads writing to it.
+    """
+
+    __files = {}
+    __files_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, path):
+        with cls.__files_lock:
+            if path not in cls.__files:
+                cls.__files[path] = cls(path)
+            return cls.__files[path]
+
+    def __init__(self, path):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__explained = set()
+        self.__file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self.__lock:
+            self.__file.write(line + "\n")
+            self.__file.flush()
+
+    def first_run(self, sql):
+        """
+        Returns True the first time the statement is seen.
+        """
+        with self.__lock:
+            if sql in self.__explained:
+                return False
+            self.__explained.add(sql)
+            return True
+
+
+def normalize(sql):
+    """
+    Collapses whitespace, so the same statement always has the same text.
+    """
+    return " ".join(sql.split())
+
+
+def full_scans(sql, plan):
+    """
+    Returns the big tables the plan reads from start to end.
+    """
+    names = {table: table for table in BIG_TABLES}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        if alias and alias.upper() not in NOT_ALIASES:
+            names[alias] = table
+    tables = set()
+    for step in plan:
+        match = FULL_SCAN.match(step)
+        if match and match.group(1) in names:
+            tables.add(names[match.group(1)])
+    return sorted(tables)
+
+
+def _param(value):
+    if isinstance(value, str) and len(value) > PARAM_LENGTH:
+        return value[:PARAM_LENGTH] + "..."
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def _params(parameters):
+    if isinstance(parameters, dict):
+        return {key: _param(value) for key, value in parameters.items()}
+    return [_param(value) for value in parameters]
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    Times execute and the fetches that follow it. The record of a query
+    is written once its rows are used up, when the cursor runs
+    the next statement, or when the cursor is closed or garbage collected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TracingCursor, self).__init__(*args, **kwargs)
+        self.__record = None
+        self.__began = None
+        # Kept to write the last record after the connection is gone
+        self.__trace_file = self.connection.trace_file
+
+    def execute(self, sql, parameters=()):
+        self.__finish()
+        self.__explain(sql, parameters)
+        self.__start(sql, parameters, 1)
+        try:
+            super(TracingCursor, self).execute(sql, parameters)
+        finally:
+            self.__after_execute()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.__finish()
+        # Rows are consumed once, keep them to explain the first
+        rows = list(seq_of_parameters)
+        if rows:
+            self.__explain(sql, rows[0])
+        self.__start(sql, rows[0] if rows else (), len(rows))
+        try:
+            super(TracingCursor, self).executemany(sql, rows)
+        finally:
+            self.__after_execute()
+        return self
+
+    def fetchone(self):
+        row = self.__timed(super(TracingCursor, self).fetchone)
+        if row is None:
+            self.__finish()
+        else:
+            self.__record["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        fetch = super(TracingCursor, self).fetchmany
+        rows = self.__timed(lambda: fetch(self.arraysize if size is None
+                                          else size))
+        if self.__record is not None:
+            self.__record["rows"] += len(rows)
+            if not rows:
+                self.__finish()
+        return rows
+
+    def fetchall(self):
+        rows = self.__timed(super(TracingCursor, self).fetchall)
+        if self.__record is not None:
+            self.__record["rows"] += len(rows)
+        self.__finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            row = self.__timed(super(TracingCursor, self).__next__)
+        except StopIteration:
+            self.__finish()
+            raise
+        if self.__record is not None:
+            self.__record["rows"] += 1
+        return row
+
+    def close(self):
+        self.__finish()
+        super(TracingCursor, self).close()
+
+    def __del__(self):
+        # Throwaway cursors read with a single fetchone end up here
+        self.__finish()
+
+    def __start(self, sql, parameters, executions):
+        self.__record = {
+            "type": "query",
+            "sql": normalize(sql),
+            "params": _params(parameters),
+            "executions": executions,
+            "rows": 0,
+            "ms": 0.0,
+            "thread": threading.current_thread().name,
+        }
+        self.__began = time.perf_counter()
+
+    def __after_execute(self):
+        self.__record["ms"] += (time.perf_counter() - self.__began) * 1000
+        # Statements without a result set are done now
+        if self.description is None:
+            self.__record["rows"] = self.rowcount
+            self.__finish()
+
+    def __timed(self, fetch):
+        began = time.perf_counter()
+        try:
+            return fetch()
+        finally:
+            if self.__record is not None:
+                self.__record["ms"] += (time.perf_counter() - began) * 1000
+
+    def __finish(self):
+        if self.__record is not None:
+            self.__record["ms"] = round(self.__record["ms"], 3)
+            self.__trace_file.write(self.__record)
+            self.__record = None
+
+    def __explain(self, sql, parameters):
+        text = normalize(sql)
+        if not text.upper().startswith(EXPLAINED) \
+                or not self.__trace_file.first_run(text):
+            return
+        try:
+            # A plain cursor, the plan itself is not traced
+            plan_cursor = sqlite3.Cursor(self.connection)
+            plan_cursor.execute("EXPLAIN QUERY PLAN " + sql, parameters)
+            plan = [row[3] for row in plan_cursor.fetchall()]
+            plan_cursor.close()
+        except sqlite3.Error as e:
+            plan = ["EXPLAIN failed: {}".format(e)]
+        scanned = full_scans(text, plan)
+        if scanned:
+            logging.warning("Full scan of %s in: %s", ", ".join(scanned), text)
+        self.__trace_file.write({
+            "type": "plan",
+            "sql": text,
+            "plan": plan,
+            "full_scans": scanned,
+        })
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    Connection whose cursors trace, Connection.execute included.
+    """
+
+    trace_path = None
+
+    def __init__(self, *args, **kwargs):
+        super(TracingConnection, self).__init__(*args, **kwargs)
+        self.trace_file = TraceFile.get(self.trace_path)
+
+    def cursor(self, factory=TracingCursor):
+        return super(TracingConnection, self).cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory(path):
+    """
+    Returns a sqlite3.connect factory writing the trace to the file.
+    """
+    return type("TracingConnection", (TracingConnection,),
+                {"trace_path": path})
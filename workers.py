@@ -0,0 +1,71 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import logging
+
+import storage
+import scheduler
+import metrics
+
+
+class GeneratorWorker(QThread):
+    """
+    Runs the generator catch-up on its own connection.
+    Tasks of every generator are sent back as soon as they are committed.
+    """
+
+    tasksGenerated = pyqtSignal(object)
+
+    def __init__(self, db_path, profile=None):
+        super(GeneratorWorker, self).__init__()
+        self.db_path = db_path
+        self.profile = profile
+
+    def run(self):
+        db = storage.Storage(self.db_path, profile=self.profile)
+        try:
+            with metrics.phase("generator catch-up"):
+                for batch in scheduler.iter_catch_up(db):
+                    self.tasksGenerated.emit(batch)
+        except Exception as e:
+            logging.exception(e)
+        finally:
+            db.close()
+        logging.info("Done generating!")
+
+
+class BoardLoader(QThread):
+    """
+    Reads the loaded part of every board cell on its own connection,
+    to check the board restored from a snapshot against the DB.
+    The cells are kept in the cells attribute, read it once the thread
+    has finished. It is None if reading failed.
+    """
+
+    def __init__(self, db_path, limits, preview, profile=None):
+        """
+        :param limits: number of tasks to read per (stage, project).
+        :param preview: text preview length, see Storage.select_cell_tasks.
+        """
+        super(BoardLoader, self).__init__()
+        self.db_path = db_path
+        self.limits = limits
+        self.preview = preview
+        self.profile = profile
+        self.cells = None
+
+    def run(self):
+        cells = {}
+        db = storage.Storage(self.db_path, profile=self.profile)
+        try:
+            for (stage, project), limit in self.limits.items():
+                records = db.select_cell_tasks(stage, project, None, limit,
+                                               preview=self.preview)
+                last_id = records[-1][0] if records else None
+                cells[(stage, project)] = (records, last_id,
+                                           len(records) < limit)
+        except Exception as e:
+            logging.exception(e)
+            cells = None
+        finally:
+            db.close()
+        self.cells = cells
@@ -0,0 +1,121 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import queue
+import logging
+import threading
+
+import storage
+
+
+class StorageWriter(QObject):
+    """
+    Applies Storage write operations on a dedicated thread.
+    The thread owns its own connection, drains the queue and commits
+    whatever has piled up in one transaction.
+    """
+
+    writeFailed = pyqtSignal(str)
+
+    def __init__(self, db_path, profile=None, batch_size=50):
+        super(StorageWriter, self).__init__()
+        self.batch_size = batch_size
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(
+            target=self.__run, args=(db_path, profile),
+            name="StorageWriter", daemon=True)
+        self.__thread.start()
+
+    def submit(self, method, *args):
+        """
+        Queues the call of the Storage method with given arguments.
+        """
+        self.__queue.put([(method, args)])
+
+    def submit_group(self, calls):
+        """
+        Queues several calls that are applied all or none.
+        :param calls: list of (method name, args) tuples.
+        """
+        self.__queue.put(list(calls))
+
+    def flush(self):
+        """
+        Blocks until every queued operation is committed or failed.
+        """
+        self.__queue.join()
+
+    def close(self):
+        """
+        Writes everything that is queued and stops the thread.
+        """
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+
+    def __run(self, db_path, profile):
+        try:
+            db = storage.Storage(db_path, profile=profile)
+        except Exception as e:
+            logging.exception(e)
+            self.__discard(str(e))
+            return
+        running = True
+        while running:
+            batch = [self.__queue.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+                self.__queue.task_done()
+
+            if not batch:
+                continue
+            try:
+                self.__apply(db, batch)
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+        db.close()
+
+    def __discard(self, message):
+        """
+        Fails every queued operation until close, so flush never hangs
+        when the connection could not be opened.
+        """
+        while True:
+            item = self.__queue.get()
+            if item is not None:
+                self.writeFailed.emit(message)
+            self.__queue.task_done()
+            if item is None:
+                break
+
+    def __apply(self, db, batch):
+        try:
+            with db.transaction():
+                for calls in batch:
+                    self.__call(db, calls)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logging.exception(e)
+                self.writeFailed.emit(str(e))
+                return
+
+        # Retry one by one, so a bad operation loses only itself
+        for calls in batch:
+            try:
+                with db.transaction():
+                    self.__call(db, calls)
+            except Exception as e:
+                logging.exception(e)
+                self.writeFailed.emit(str(e))
+
+    @staticmethod
+    def __call(db, calls):
+        for method, args in calls:
+            getattr(db, method)(*args)